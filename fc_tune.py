@@ -4,12 +4,11 @@ Written by Yash Joshi
 February 2021
 '''
 
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import misc
-import peakutils as pt
-from time import sleep
-from scipy.optimize import minimize
+from scipy.optimize import minimize, minimize_scalar
 
 
 #The experimental setup on which this code was first run uses the Python based measurement environemnt called QTlab, which can be downloaded from - https://github.com/heeres/qtlab
@@ -33,8 +32,82 @@ vna = qt.instruments.get('vna') #Vector network analyser
 tnm.set_speed(15) # Coupling motor speed
 err_depth = 10 ** -3 # Error we want in tuning the resonance depth - E_D in eq (3) of the manuscript
 err_lin = 1e4 #  Error we want in tuning the resonance frequency - E_\omega in eq (3) of the manuscript
+last_center_depth = {} # Depth at the tuning frequency for every point evaluated by the Nelder Mead, keyed by (lin, coup)
+_LOOKUP = {'path': None, 'mtime': None, 'table': None} # Parsed lookup table, reloaded only when the file changes
+lookup_dtype = [('freq_ghz', 'f8'), ('pos_mm', 'f8')] # Columns of the lookup table
+_lin_slopes = {} # Measured df/dx (Hz/mm) of the linear stage, keyed by frequency bucket
+lin_slope_bucket = 100e6 # Width of the frequency buckets of _lin_slopes
+lin_slope_range = (-1e9, -1e7) # Plausible df/dx (Hz/mm) of the linear stage, a measured slope outside it is not trusted
+lin_step_max = 0.5 # Largest secant step (mm) of the linear stage in lin_stage_fine_tune
+_last_run = {'fr': None, 'simplex': None} # Tuning frequency and final simplex of the last fine_tune_nm run
+warm_start_range = 50e6 # Largest frequency change for which fine_tune_nm starts from _last_run
+vna_max_nop = 100000 # Largest number of points the VNA accepts
+vna_span_steps = np.array([0, 5, 20]) # Nelder Mead steps after which the VNA span is narrowed
+vna_spans = np.array([200e6, 100e6, 50e6]) # VNA span used by the Nelder Mead after each of vna_span_steps
+collapse_tol = 1e-3 # Simplex area over its longest edge squared below which the Nelder Mead counts as collapsed
+
+
+class _Converged(BaseException):
+    '''
+        Raised from inside the Nelder Mead to stop it once the depth target is reached
+    '''
+
+
+class _Collapsed(BaseException):
+    '''
+        Raised from inside the Nelder Mead when its simplex has degenerated and it should be reseeded
+    '''
+
+
+def simplex_area_of(points):
+    '''
+        Area of the triangle spanned by three (lin, coup) points, 0 for fewer points
+    '''
+    if len(points) < 3:
+        return 0.
+    p0, p1, p2 = np.asarray(points, dtype=float)
+    return abs(np.cross(p1 - p0, p2 - p0)) / 2.
+
+
+def simplex_shape_of(points):
+    '''
+        Scale free flatness of the triangle spanned by three (lin, coup) points: area over longest edge squared.
+        About 0.43 for an equilateral triangle, 0 for three points on a line
+    '''
+    p = np.asarray(points, dtype=float)
+    longest = max(np.sum((p[i] - p[i-1])**2) for i in range(3))
+    if longest == 0:
+        return 0.
+    return simplex_area_of(p) / longest
+
 
-def fine_tune_nm(fr, verbose = False, lin_span = 0.5, coup_span = 0.1*2*np.pi, small_change=True, scan_coupling = False, plot = False, hold = True, label = None):
+def next_simplex(simplex, trials):
+    '''
+        Nelder Mead simplex after one iteration, rebuilt from the points the iteration evaluated.
+        simplex: the three vertices as [lin, coup, cost] before the iteration
+        trials: the points evaluated during the iteration, in order, as [lin, coup, cost]
+        An iteration either replaces the worst vertex by one of its trial points (reflection, expansion or
+        contraction), or, after a rejected contraction, shrinks the other two vertices towards the best one,
+        which are then the last two points it evaluated.
+        Acceptance follows scipy: an expansion is kept only if strictly better than the reflection it follows,
+        a contraction as soon as it is no worse than the reflection.
+    '''
+    simplex = sorted(simplex, key=lambda v: v[2])
+    if len(trials) > 2:
+        return [simplex[0]] + trials[-2:]
+    if len(trials) == 2:
+        xr, xn = trials
+        if xr[2] < simplex[0][2]: # reflection beat the best vertex, xn is the expansion
+            accepted = xn if xn[2] < xr[2] else xr
+        else: # xn is the contraction
+            accepted = xn if xn[2] <= xr[2] else xr
+        return simplex[:-1] + [accepted]
+    if trials:
+        return simplex[:-1] + trials
+    return simplex
+
+
+def fine_tune_nm(fr, verbose = False, lin_span = 0.5, coup_span = 0.1*2*np.pi, small_change=True, scan_coupling = False, plot = False, hold = True, label = None, max_restarts = 1, warm_start = False, seed = 0):
     '''
     Fine tuning with Nelder mead algorithm using linear motor (zls) and a stepper motor (tnm)
 
@@ -42,72 +115,100 @@ def fine_tune_nm(fr, verbose = False, lin_span = 0.5, coup_span = 0.1*2*np.pi, s
     coup_span:    Phase span of initial simplex
     min_ints:   Minimal number of iterations
     scan_coupling: 
+    max_restarts: Number of times the simplex is reseeded after collapsing onto a line
+    seed: Seed of the random generator drawing the reseeded simplex, so that runs are reproducible
+    warm_start: Start from the final simplex of the previous run if it was within warm_start_range of fr, skipping the lookup and scans.
+                Ignored when the lookup (small_change=False) or the coupling scan (scan_coupling=True) is asked for
 
     '''
 
     qt.mstart() #QTlab starts measurement
     settings = netw.setoutrange() # Setting the VNA outside the desired tuning range and saving the previous parameters
 
-    # Initializing and defining the variables and parameters
-    global x_min, level_min, nstep, vnaspan
-    x_min = [0,0]
-    level_min = 0
-    nstep = 0
-    vnaspan = 200e6 #200 MHz
-    global levels_its
+    # Initializing and defining the variables and parameters, shared with the closures below
+    state = {'x_min': [0,0],
+             'level_min': 0,
+             'nstep': 0,
+             'vnaspan': vna_spans[0],
+             'simplex': [], # Current vertices of the Nelder Mead as [lin, coup, cost], rebuilt after every iteration
+             'trials': []} # Points evaluated in the current iteration
     levels_its = []
+    levels_at = {} # Cost of every point already measured, keyed by (lin, coup, vnaspan)
     zls.step_to_mm = 0.047625e-3 #zaber motor specification 
+    last_center_depth.clear()
 
     #Defining what the algorithm should physically when a new point is interpolated by the Nelder Mead
     def parameter_changer(x):
-        zls.move_abs_mm(x[0])
+        #Both motors are submitted before waiting on either, so the two moves overlap
+        zls.move_abs_mm(x[0], blocking=False)
         tnm.move_absolute(x[1])
+        zls.poll_until_idle()
         tnm.wait()
 
         #while tnm.speed():
         #    qt.msleep(0.2*delay)
 
+    def track(x, level):
+        #The first three evaluations after a (re)start are the initial vertices, later ones the trial points of an iteration
+        if len(state['simplex']) < 3:
+            state['simplex'].append([x[0], x[1], level])
+        else:
+            state['trials'].append([x[0], x[1], level])
+
     def f(x):
         '''
             Evaluate the cost functiona again and terminate the algorithm if sufficient depth is reached
         '''
 
-        parameter_changer(x) #Update to new point
+        key = (x[0], x[1], state['vnaspan'])
+        if key in levels_at: #Point already measured, no need to move the motors or sweep again
+            track(x, levels_at[key])
+            return levels_at[key]
 
-        global x_min, level_min, vnaspan
+        parameter_changer(x) #Update to new point
 
-        level = costfunction(fr, span=vnaspan)
+        level, lp = costfunction(fr, span=state['vnaspan'], center_depth=True)
         print 'Cost = ', level
+        levels_at[key] = level
         levels_its.append([x[0], x[1], level])
-        lp = tone_depth_lin(fr)['depth']
+        track(x, level)
+        last_center_depth[tuple(x)] = lp #Reused by the callback instead of sweeping again
         if lp <err_depth:
             print 'Level reached'
-            raise Exception('Termination!!!')
-        if level < level_min:
-            level_min = level
-            x_min = x
+            raise _Converged()
+        if level < state['level_min']:
+            state['level_min'] = level
+            state['x_min'] = x
 
         return level
 
 
     # setup of initial condition
-    if not small_change:
-        #Lookup the position in the lookup table
-        poses = np.flip(position_lookup(fr))
-        zls.move_abs_mm(poses[0])
-
-        #Fine tune just by detecting a resonant mode close by and moving it closer to desired frequency
-        lin_stage_fine_tune(fr) 
-        lin_ini = zls.current_position()
-    else:
-        lin_ini = zls.current_position() 
-
-    if scan_coupling:
-        #Scan the pin coupler angle over 360 degrees
-        scan_coup(fr)
-        coup_ini = tnm.get_position()
+    warm_simplex = None
+    if warm_start and small_change and not scan_coupling and _last_run['fr'] is not None and abs(fr - _last_run['fr']) < warm_start_range:
+        #Reusing the final simplex of the previous nearby run, shifted along the linear stage by the expected frequency change
+        slope = _lin_slopes.get(int(round(fr / lin_slope_bucket)))
+        shift = (fr - _last_run['fr']) / slope if plausible_slope(slope) else 0.
+        warm_simplex = [[lin + shift, coup] for lin, coup in _last_run['simplex']]
+        lin_ini, coup_ini = warm_simplex[0]
     else:
-        coup_ini = tnm.get_position()
+        if not small_change:
+            #Lookup the position in the lookup table
+            poses = np.flip(position_lookup(fr))
+            zls.move_abs_mm(poses[0])
+
+            #Fine tune just by detecting a resonant mode close by and moving it closer to desired frequency
+            lin_stage_fine_tune(fr) 
+            lin_ini = zls.current_position()
+        else:
+            lin_ini = zls.current_position() 
+
+        if scan_coupling:
+            #Scan the pin coupler angle over 360 degrees
+            scan_coup(fr)
+            coup_ini = tnm.get_position()
+        else:
+            coup_ini = tnm.get_position()
 
     x0 = [lin_ini, coup_ini] #Define the intial point
 
@@ -116,6 +217,9 @@ def fine_tune_nm(fr, verbose = False, lin_span = 0.5, coup_span = 0.1*2*np.pi, s
     initial_simplex = [[x0[0], x0[1]],
                        [x0[0] - 0.1, x0[1]],
                        [x0[0], x0[1] + 0.05*coup_span]] # 3 points in the desirable neighbourhood of the parameter space
+    initial_edges = np.array([0.1, 0.05*coup_span])
+    if warm_simplex is not None:
+        initial_simplex = warm_simplex
 
 
     print initial_simplex
@@ -127,72 +231,126 @@ def fine_tune_nm(fr, verbose = False, lin_span = 0.5, coup_span = 0.1*2*np.pi, s
             1.counts number of steps
             2.reduces the VNA span to focus on the desired frequency
             3.terminates if sufficient depth level is attained
+            4.restarts if the simplex has collapsed onto a line
         '''
-        global nstep, vnaspan
-        nstep +=1
-        print nstep
-        if nstep>5: vnaspan = 100e6
-        if nstep>20: vnaspan = 50e6
-        vna.set_span(vnaspan)
-        set_vna(fr)
+        state['nstep'] +=1
+        print state['nstep']
+        state['simplex'] = next_simplex(state['simplex'], state['trials'])
+        state['trials'] = []
+        vnaspan = vna_spans[np.searchsorted(vna_span_steps, state['nstep']) - 1]
+        if vnaspan != state['vnaspan']: #Only reconfiguring the VNA when the span bucket changes
+            state['vnaspan'] = vnaspan
+            vna.set_span(vnaspan)
+            set_vna(fr)
+            vna.wait_for_sweep() #Only after reconfiguring, before anything reads the trace
         #print xk
         # val = [zls.current_position(), tnm.get_postion()]
-        global x_min, level_min
-        level = tone_depth_lin(fr)['depth']
-        sleep(0.3)
+        level = last_center_depth.get(tuple(xk))
+        if level is None:
+            level = tone_depth_lin(fr)['depth']
         if level <err_depth:
             print 'level reached'
-            raise Exception('Termination!!!')
-
-
-    try:
-        #Main Nelder mead function call
-        res = minimize(f, x0,method = 'nelder-mead',tol = 0.01,callback = callback,
-                       bounds = ((xliblin, xublin),(0, None)),
-                       options = {'initial_simplex': initial_simplex,
-                                  'disp': verbose,
-                                  'maxiter': 40})
-        force_termination = False
-        
-        qt.msleep()
-    except Exception as inst:
-        if not str(inst) == 'Termination!!!':
-            raise
-        force_termination = True
+            raise _Converged()
+
+        #Flatness of the current vertices, independent of how far the simplex has contracted
+        if simplex_shape_of([v[:2] for v in state['simplex']]) < collapse_tol:
+            state['ncollapsed'] += 1
+        else:
+            state['ncollapsed'] = 0
+        if state['ncollapsed'] >= 3:
+            print 'Simplex collapsed'
+            raise _Collapsed()
+
+
+    rng = np.random.RandomState(seed)
+    force_termination = False
+    final_simplex = None # Vertices the Nelder Mead ended on, None if it only ever collapsed
+    for restart in range(max_restarts + 1):
+        state['ncollapsed'] = 0
+        state['simplex'] = []
+        state['trials'] = []
+        try:
+            #Main Nelder mead function call
+            res = minimize(f, initial_simplex[0],method = 'nelder-mead',tol = 0.01,callback = callback,
+                           bounds = ((xliblin, xublin),(0, None)),
+                           options = {'initial_simplex': initial_simplex,
+                                      'adaptive': True, # Gao-Han dimension-scaled coefficients
+                                      'disp': verbose,
+                                      'maxiter': max(40 - state['nstep'], 1)})
+            
+            qt.msleep()
+            final_simplex = res.final_simplex[0].tolist()
+            break
+        except _Converged:
+            force_termination = True
+            final_simplex = [v[:2] for v in state['simplex']] #Vertices after the last completed iteration
+            break
+        except _Collapsed:
+            #Reseeding around the best vertex with randomly scaled and flipped edges, as long as the longest edge of the collapsed simplex
+            best = min(state['simplex'], key=lambda v: v[2])
+            vertices = np.array([v[:2] for v in state['simplex']])
+            longest = max(np.linalg.norm(vertices[i] - vertices[i-1]) for i in range(3))
+            edges = initial_edges * (longest / np.linalg.norm(initial_edges))
+            edges = edges * rng.choice([-1, 1], 2) * rng.uniform(0.5, 1.5, 2)
+            initial_simplex = [[best[0], best[1]],
+                               [best[0] + edges[0], best[1]],
+                               [best[0], best[1] + edges[1]]]
+            print initial_simplex
+
+    #Keeping the final simplex to warm start the next run nearby, unless it has collapsed
+    if final_simplex is not None and len(final_simplex) == 3 and simplex_shape_of(final_simplex) >= collapse_tol:
+        _last_run['fr'] = fr
+        _last_run['simplex'] = final_simplex
 
     netw.setbackrange(settings) #Setting the VNA back where we started from 
     vna.set_centerfreq(fr)
     qt.mend() #QTlab ends measurement
     return levels_its
 
+def load_lookup(path=r'lookuptble.csv'):
+    '''
+        Parse the lookup table of (frequency, position) pairs, reusing the previous parse if the file is unchanged
+    '''
+    mtime = os.path.getmtime(path)
+    if _LOOKUP['path'] != path or _LOOKUP['mtime'] != mtime:
+        _LOOKUP['table'] = np.genfromtxt(path, delimiter=',', dtype=lookup_dtype)
+        _LOOKUP['path'] = path
+        _LOOKUP['mtime'] = mtime
+    return _LOOKUP['table']
+
+
 def position_lookup(fr):
     '''
         Lookup the resonance modes from the table
     '''
     fr = fr/1e9
-    res_filt = np.genfromtxt(r'lookuptble.csv', delimiter=',')  
-    lookup = {}
-    lookup['Position (mm)'] = res_filt.T[1]
-    lookup['Frequency (GHz)'] = res_filt.T[0]
+    res_filt = load_lookup()
+    freqs = res_filt['freq_ghz']
+    positions = res_filt['pos_mm']
 
-    lst = lookup['Frequency (GHz)']
-    idx = [list(lst).index(x) for x in lst if np.abs(x - fr) < 0.01] #Finding the position
+    idx = np.flatnonzero(np.abs(freqs - fr) < 0.01) #Finding the position
     print(idx)
 
     #No suitable resonances in certain frequency ranges
-    if idx == []:
-        idx = np.abs(lookup['Frequency (GHz)'] - fr).argmin()
+    if idx.size == 0:
         print('Warning: You are trying to set the filter cavity in an undesirable frequency.')
         return []
 
-    positions = list(lookup['Position (mm)'][idx])
-    positions = sorted(positions)
-    # Multiple possible resonances- choose the closest one
-    poses = positions[:1]
-    for i in positions[1:]:
-        if i >= poses[-1] + 1.8:
-            poses.append(i)
-    return poses
+    positions = np.sort(positions[idx])
+    # Multiple possible resonances- keep the first of every group within 1.8 mm, jumping straight to the next group
+    keep = [0]
+    nxt = np.searchsorted(positions, positions[0] + 1.8)
+    while nxt < positions.size:
+        keep.append(nxt)
+        nxt = np.searchsorted(positions, positions[nxt] + 1.8)
+    return positions[keep]
+
+
+def plausible_slope(slope):
+    '''
+        Whether a measured df/dx of the linear stage has the expected sign and magnitude, see lin_slope_range
+    '''
+    return slope is not None and lin_slope_range[0] <= slope <= lin_slope_range[1]
 
 
 def lin_stage_fine_tune(fr, span = 500e6):
@@ -201,22 +359,31 @@ def lin_stage_fine_tune(fr, span = 500e6):
     '''
     sets = netw.setoutrange() #Setting the VNA outside the desired tuning range and saving the previous parameters
     scan_coup(fr) #Maximize resonance depths
-    resonances = res_detect(fr - 5*span / 10., fr + 5*span / 10., rbw=5e4)
-    meas = np.array([tone_depth_lin(frs) for frs in resonances])
-    depths = np.array([mea['depth'] for mea in meas]) #Find tone depths
-    resonances = np.array([1e9*mea['Frequency'] for mea in meas])
-    print meas, depths, resonances
+    resonances, freqs, amps = res_detect(fr - 5*span / 10., fr + 5*span / 10., rbw=5e4, return_trace=True)
+    depths, resonances = tone_depths(resonances, freqs, amps) #Find tone depths from the same trace
+    print depths, resonances
     idx = np.argmin(depths) 
     sel_res = resonances[idx] #select resonances to fit
     print 're', sel_res
     delf = fr - sel_res
     m = 0
 
+    #Secant steps on the measured df/dx, cached per frequency bucket so nearby tunings skip the first adaptive move.
+    #A slope is only used if plausible (a mode hop gives a tiny or wrong-signed one) and only cached once its step reduced |delf|
+    bucket = int(round(fr / lin_slope_bucket))
+    slope = _lin_slopes.get(bucket)
+    x_prev, f_prev = zls.current_position() * zls.step_to_mm, sel_res
+
     #Fine tuning while repeatedly minimizing the frequency difference
     while abs(delf) > 1e6:
         set_vna(sel_res);vna.set_span(30e6)
-        sleep(0.3)
-        move_adapt(delf)
+        vna.wait_for_sweep()
+        if plausible_slope(slope):
+            used_slope = slope
+            zls.move_rel_mm(np.clip(delf / slope, -lin_step_max, lin_step_max))
+        else:
+            used_slope = None
+            move_adapt(delf)
         sel_res = res_detect(sel_res - 30e6, sel_res+30e6, rbw=1e5)
         m += 1
         if m>25: break
@@ -226,20 +393,28 @@ def lin_stage_fine_tune(fr, span = 500e6):
             break
         print sel_res
         sel_res = sel_res[0]
-        delf = fr - sel_res
+        delf_prev, delf = delf, fr - sel_res
+        if used_slope is not None and abs(delf) < abs(delf_prev):
+            _lin_slopes[bucket] = used_slope
+
+        x = zls.current_position() * zls.step_to_mm
+        if x != x_prev:
+            slope = (sel_res - f_prev) / (x - x_prev)
+        x_prev, f_prev = x, sel_res
 
 
     netw.setbackrange(sets) #Setting back the VNA resonances
     return resonances, depths
 
 
-def scan_coup(fr, span= 200e6,  step=np.pi/100, thetaspan=2*np.pi):
+def scan_coup(fr, span= 200e6,  step=np.pi/100, thetaspan=2*np.pi, ncoarse=8):
     '''
     Scans the coupling over 360 degrees and finds the best angle for which the depth is maximum, which can then be given as the initial simplex of the Nelder-Mead algorithm.
         fr:center frequency
         span: span of the VNA
-        step: minimum step size in angle during the scan 
+        step: angle resolution to which the best coupling is refined
         thetaspan:range of theta values over which to scan the couplings.  
+        ncoarse: number of evenly spaced angles in the coarse scan, before the refinement around the best one
     '''
     qt.mstart()
     vna.set_span(span)
@@ -248,15 +423,31 @@ def scan_coup(fr, span= 200e6,  step=np.pi/100, thetaspan=2*np.pi):
     # tnm.wait()
     current_position = tnm.get_position()
     # print "zero set",current_position
-    depths = []
-    positions = np.arange(current_position,current_position+thetaspan, step)
-    for i in range(int(thetaspan/step) +1):
-        dep = tone_depth(fr, rbw = 1e6)['depth (dB)']
-        if dep < -25: break
-        depths.append(dep)
-        tnm.move_relative(step)
+
+    def depth_at(theta):
+        tnm.move_absolute(theta)
         tnm.wait()
         print tnm.get_position()
+        return tone_depth(fr, rbw = 1e6)['depth (dB)']
+
+    #Coarse scan over the whole rotation, stopping as soon as the resonance is deep enough
+    coarse_step = thetaspan / ncoarse
+    positions = current_position + coarse_step * np.arange(ncoarse)
+    depths = []
+    for theta in positions:
+        dep = depth_at(theta)
+        if dep < -25: 
+            qt.mend()
+            return
+        depths.append(dep)
+    best = positions[np.argmin(depths)]
+
+    #Refining around the best coarse angle, depth vs angle is unimodal within one coarse step
+    res = minimize_scalar(depth_at, bounds=(best - coarse_step, best + coarse_step), method='bounded',
+                          options={'xatol': step})
+    target = res.x if res.fun < min(depths) else best
+    tnm.move_absolute(target)
+    tnm.wait()
     qt.mend()
     # return target_position, min(depths), new_pos - target_position
 
@@ -270,7 +461,7 @@ def tone_depth_lin(centerfreq, span=0.1e6, rbw =1e5):
     # vna.set_centerfreq(centerfreq)
     set_vna(centerfreq, rbw)
     freqs, trace = netw.trace(measure=1, get_result=1, make_plot=0, make_data=0)
-    amps = np.abs(trace)**2
+    amps = trace.real**2 + trace.imag**2 #|S21|^2 without the square root of np.abs
     # ampdb = 10*np.log10(amps)
     # depth = np.min(ampdb)
     idx = np.argmin(abs(freqs-centerfreq/1e9))
@@ -285,36 +476,52 @@ def tone_depth_lin(centerfreq, span=0.1e6, rbw =1e5):
 
 
 
-def costfunction(fr, span= 200e6):
+def tone_depths(centerfreqs, freqs, amps, span=0.1e6):
+    '''
+        Depths at centerfreqs and frequencies of the minima within span around each of them, read off an acquired trace.
+        A tone without any trace point within span keeps its own frequency
+        centerfreqs: frequencies (Hz) of the tones
+        freqs, amps: frequencies (Hz) and |S21|^2 of the trace
+    '''
+    centerfreqs = np.asarray(centerfreqs, dtype=float)
+    depths = np.interp(centerfreqs, freqs, amps)
+    in_window = np.abs(freqs[np.newaxis, :] - centerfreqs[:, np.newaxis]) <= span/2.
+    idx = np.argmin(np.where(in_window, amps, np.inf), axis=1)
+    return depths, np.where(in_window.any(axis=1), freqs[idx], centerfreqs)
+
+
+
+def costfunction(fr, span= 200e6, center_depth=False):
     '''
         fr: Tuning frequency
         span: span over which to find resonances
+        center_depth: also return the depth at fr, read off the same trace
     '''
 
-    #Detecting resonances within a cetain range
-    resonances = res_detect(fr - span/2. , fr + span/2., rbw = 5e4)
+    #Detecting resonances within a cetain range, keeping the trace they were found in
+    resonances, freqs, amps = res_detect(fr - span/2. , fr + span/2., rbw = 5e4, return_trace=True)
 
-    #Measureing depths of resonances
-    meas = np.array([tone_depth_lin(frs) for frs in resonances])
+    #Reading the depths of the resonances off that trace instead of sweeping each one again
+    depths = np.interp(resonances, freqs, amps)
 
-    resonances = np.array([1e9*mea['Frequency'] for mea in meas])
-    depths = np.array([mea['depth'] for mea in meas])
 
-
-    dic =  {}
-    dic['lin'] =  (resonances - fr)**2/err_lin**2 #Frequency dependent term in the cost function
-    dic['dep'] = depths**2/err_depth**2 #Coupling dependent term in the cost function
-    dic['tot'] = np.min(dic['lin'] + dic['dep']) #Total cost function
+    #Frequency dependent plus coupling dependent term, in decades above the target errors, minimised over the resonances
+    lin_decades = np.log10(np.maximum(np.abs(resonances - fr), err_lin) / err_lin)
+    dep_decades = np.log10(np.maximum(depths, err_depth) / err_depth)
+    cost = np.min(lin_decades**2 + dep_decades**2) #Total cost function
 
     vna.Autoscale()
 
-    return dic['tot'] 
+    if center_depth:
+        return cost, np.interp(fr, freqs, amps)
+    return cost
 
 
-def res_detect(startfreq, stopfreq, rbw = 5e4, doplot=False):
+def res_detect(startfreq, stopfreq, rbw = 5e4, doplot=False, return_trace=False):
     ''' 
     Detects resonances within the given frequency range
         rbw: bandwidth
+        return_trace: also return the frequencies (Hz) and |S21|^2 of the acquired trace
 
     '''
     #Acquiring the VNA trace, and calculating the phase gradient 
@@ -327,7 +534,10 @@ def res_detect(startfreq, stopfreq, rbw = 5e4, doplot=False):
     peaksdata = rs.find_peaks(freqs=freqeuncies, grads=phase_gradient, dist_peaks=1e5, svp=4, winlen=1e9, doplot=doplot)
     res_freqs = peaksdata['Peak freqs filt']
 
-    return np.array(res_freqs)
+    if return_trace:
+        trace = vnadata['Trace']
+        return np.asarray(res_freqs), freqeuncies, trace.real**2 + trace.imag**2
+    return np.asarray(res_freqs)
 
 
 def set_vna(fr, rbw=1e5):
@@ -336,10 +546,12 @@ def set_vna(fr, rbw=1e5):
         rbw: bandwidth
     '''
     vna_span = vna.get_span()
-    nop = 5 * vna_span / rbw #To make sure we have sufficient points and bandwidth ratio to span the whole frequency range
-    vna.set_bandwidth(rbw)
+    nop = int(min(5 * vna_span / rbw, vna_max_nop)) #To make sure we have sufficient points and bandwidth ratio to span the whole frequency range
+
+    #Only writing the settings that changed, compared against the values the driver last set
+    if vna.get_bandwidth(query=False) != rbw: vna.set_bandwidth(rbw)
     vna.set_centerfreq(fr)
-    vna.set_nop(nop)
-    vna.set_power(10)
+    if vna.get_nop(query=False) != nop: vna.set_nop(nop)
+    if vna.get_power(query=False) != 10: vna.set_power(10)
 
 
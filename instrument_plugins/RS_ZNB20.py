@@ -6,6 +6,18 @@ from numpy import pi
 import numpy as np
 import time
 
+_rm = None # VISA resource manager shared by every instance, see _resource_manager
+
+
+def _resource_manager():
+    '''
+    Create the VISA resource manager on first use and reuse it afterwards
+    '''
+    global _rm
+    if _rm is None:
+        _rm = visa.ResourceManager()
+    return _rm
+
 
 class RS_ZNB20(Instrument):
     '''
@@ -15,6 +27,13 @@ class RS_ZNB20(Instrument):
     Initialize with
     <name> = instruments.create('name', 'ZNB20', address='<GPIB address>', reset=True|False)
     '''
+    # Prebuilt messages for the settings changed most often, the queries after a setting read back what it changes
+    _SET_CENTERFREQ = (b'frequency:center %.15g;:frequency:start?;:frequency:stop?\n', ('startfreq', 'stopfreq'))
+    _SET_SPAN = (b'frequency:span %.15g;:frequency:start?;:frequency:stop?\n', ('startfreq', 'stopfreq'))
+    _SET_STARTFREQ = (b'frequency:start %.15g;:frequency:center?;:frequency:span?\n', ('centerfreq', 'span'))
+    _SET_STOPFREQ = (b'frequency:stop %.15g;:frequency:center?;:frequency:span?\n', ('centerfreq', 'span'))
+    _SET_POWER = b'source:power %.15g\n'
+
     def __init__(self, name, address, reset = False):
         '''
         Initializes the ZNB20
@@ -29,10 +48,18 @@ class RS_ZNB20(Instrument):
         Instrument.__init__(self, name, tags=['physical'])
            
         self._address = address
-        rm = visa.ResourceManager()
-        self._visainstrument = rm.open_resource(self._address)
+        self._visainstrument = _resource_manager().open_resource(self._address)
+        # large enough to read a full 100000 point trace in one viRead, and long enough for slow sweeps
+        self._visainstrument.chunk_size = 4*1024*1024
+        self._visainstrument.read_termination = '\n'
+        self._visainstrument.write_termination = '\n'
+        self._visainstrument.timeout = 60000
         
         self._zerospan = False
+        self._srq_enabled = False # whether enable_srq has set up the service request used by wait_measure
+        self._freqpoints = (None, None) # (startfreq, stopfreq, nop) and the frequency points last built from them
+        self._diags = None # diagram numbers on the display, read once by yscale_auto_alldiag
+        self._static = {} # identification, reference and convmode as last read or set, these only change through this driver
         
         self.add_parameter('span', flags=Instrument.FLAG_GETSET, units='Hz', minval=1, maxval=20e9-100e3, type=types.FloatType)
         self.add_parameter('centerfreq', flags=Instrument.FLAG_GETSET, units='Hz', minval=100e3, maxval=20e9, type=types.FloatType)
@@ -64,7 +91,13 @@ class RS_ZNB20(Instrument):
 #        self.add_function('get_tracedata')
 #        self.add_function('get_sweeptime')
         self.add_function('avg_clear')
+        self.add_function('wait_for_sweep')
+        self.add_function('measure_blocking')
+        self.add_function('sweep_and_fetch')
+        self.add_function('enable_srq')
+        self.add_function('wait_measure')
         
+        self.set_data_format()
         if reset :          
             self.reset()       
         self.get_all()
@@ -85,8 +118,22 @@ class RS_ZNB20(Instrument):
         '''
         logging.info(__name__ + ' : Resetting instrument')
         self._visainstrument.write('*RST')
+        self._srq_enabled = False # after a reset, enable_srq has to set up the service request again
+        self._static.clear()
+        self._diags = None
+        self.set_data_format()
         self.set_reference('EXT')
 
+    def set_data_format(self):
+        '''
+        Transfer trace data as little-endian binary 64 bit floats, *RST sets it back to ASCII
+        Input:
+            None
+        Output:
+            None
+        '''
+        self._visainstrument.write('format:data real,64;:format:border swap')
+
     def get_all(self):
         '''
         Get all parameters of the intrument
@@ -96,20 +143,32 @@ class RS_ZNB20(Instrument):
             None
         '''
         logging.info(__name__ + ' : get all')
-        self.get_power()
-        self.get_centerfreq()
-        self.get_span()
-        self.get_startfreq()
-        self.get_stopfreq()
-        self.get_averages()
-        self.get_Average()
-        self.get_nop()
-        self.get_bandwidth()
-        self.get_status()
-        self.get_reference()
-        self.get_convmode()
-        # self.get_convoffset() # not working quite well
-        self.get_identification()
+        onoff = lambda stat: {1: 'ON', 0: 'OFF'}[int(stat)]
+        upper = lambda stat: stat.upper()
+        params = [('power', 'source:power?', float),
+                  ('centerfreq', 'frequency:center?', float),
+                  ('span', 'frequency:span?', float),
+                  ('startfreq', 'frequency:start?', float),
+                  ('stopfreq', 'frequency:stop?', float),
+                  ('averages', 'average:count?', int),
+                  ('Average', 'average?', onoff),
+                  ('nop', 'sens:sweep:points?', int),
+                  ('bandwidth', 'sens:band?', float),
+                  ('status', 'output?', onoff),
+                  ('reference', 'rosc?', upper),
+                  ('convmode', 'sense:freq:conv?', upper),
+                  # ('convoffset', ...) # not working quite well
+                  ('identification', '*IDN?', str)]
+        for name in self._static:
+            self.update_value(name, self._static[name])
+        params = [param for param in params if param[0] not in self._static]
+        # one compound query instead of a round-trip per parameter
+        values = self._batched_query([cmd for name, cmd, parse in params])
+        for (name, cmd, parse), value in zip(params, values):
+            value = parse(value)
+            if name in ('identification', 'reference', 'convmode'):
+                self._static[name] = value
+            self.update_value(name, value)
 
            
 ###########################################################################################################################################################################
@@ -119,7 +178,7 @@ class RS_ZNB20(Instrument):
 ############################################################################################################################################################################          
                         
     def get_sweeptime(self):
-        return float(self._visainstrument.query('sweep:time?'))
+        return self._fquery('sweep:time?')
     
     def avg_clear(self):
         self._visainstrument.write('average:clear')
@@ -127,6 +186,16 @@ class RS_ZNB20(Instrument):
     def meas_over(self):
         return bool(int(self._visainstrument.query('*ESR?')))	
     
+    def wait_for_sweep(self):
+        '''
+        Block until the instrument has completed all pending settings and sweeps
+        Input:
+            None
+        Output:
+            None
+        '''
+        self._visainstrument.query('*OPC?')
+
     def measure(self):
         '''
         init measurement
@@ -138,7 +207,53 @@ class RS_ZNB20(Instrument):
         self._visainstrument.write('initiate:cont off')
         self._visainstrument.write('init:imm ')
         self._visainstrument.write('*OPC')
+
+    def enable_srq(self):
+        '''
+        Let operation complete raise a service request, so that wait_measure can sleep until a measurement is over.
+        Clears the error queue and the status registers, call it once before measure()
+        Input:
+            None
+        Output:
+            None
+        '''
+        self._visainstrument.write('*CLS;*ESE 1;*SRE 32')
+        self._srq_enabled = True
+
+    def wait_measure(self, timeout=None):
+        '''
+        Sleep until the measurement started by measure() is over, woken by the instrument's service request.
+        Needs enable_srq() to have been called before measure()
+        Input:
+            timeout (float): longest wait in ms, defaults to the VISA session timeout
+        Output:
+            None
+        '''
+        if not self._srq_enabled:
+            raise ValueError('Call enable_srq() before measure() to use wait_measure()')
+        if timeout is None:
+            timeout = self._visainstrument.timeout
+        self._visainstrument.wait_for_srq(timeout)
+        self._visainstrument.query('*ESR?') # clears the event status for the next measurement
         
+    def measure_blocking(self, timeout=None):
+        '''
+        init measurement and return once it is finished, the instrument holds the *OPC? reply until then
+        Input:
+            timeout (float): longest wait in ms, defaults to the VISA session timeout
+        Output:
+            None
+        '''
+        logging.info(__name__ + ' : measure and block till it is finished')
+        old_timeout = self._visainstrument.timeout
+        if timeout is not None:
+            self._visainstrument.timeout = timeout
+        try:
+            self._visainstrument.write('initiate:cont off')
+            self._visainstrument.query('init:imm;*OPC?')
+        finally:
+            self._visainstrument.timeout = old_timeout
+
     # get_tracedata part   
     
     def get_tracedata(self):
@@ -149,13 +264,48 @@ class RS_ZNB20(Instrument):
         Output:
             complex trace values
         '''
-        dstring=self._visainstrument.query('calculate:Data? Sdata')
+        trace = self._query_trace('calculate:Data? Sdata')
         self._visainstrument.write('init:cont on')
-        real, im= np.reshape(np.array(dstring.split(','),dtype=float),(-1,2)).T
-        return real + im * 1j              
+        return trace
+
+    def sweep_and_fetch(self):
+        '''
+        Take a single sweep and get its trace in one transaction, *WAI holds the data query until the sweep is done
+        Input:
+            None
+        Output:
+            complex trace values
+        '''
+        logging.info(__name__ + ' : sweep and fetch the trace')
+        return self._query_trace('initiate:cont off;:init:imm;*WAI;:calculate:Data? Sdata;:init:cont on')
+
+    def _query_trace(self, msg):
+        '''
+        Send a message ending in a Sdata query and read the binary trace block
+        Input:
+            msg (string): message to send
+        Output:
+            complex trace values
+        '''
+        # the REAL,64 block holds 0x0A bytes, so the read must end on the END message and not at the read termination,
+        # which older pyvisa versions would otherwise stop the block read at
+        read_termination = self._visainstrument.read_termination
+        self._visainstrument.read_termination = None
+        try:
+            data = self._visainstrument.query_binary_values(msg, datatype='d',
+                                                            is_big_endian=False, container=np.array)
+        finally:
+            self._visainstrument.read_termination = read_termination
+        # interleaved float64 (re, im) pairs have the memory layout of complex128
+        return np.ascontiguousarray(data, dtype=np.float64).view(np.complex128)
       
     def get_freqpoints(self, query = False):      
-        return np.linspace(self.get_startfreq(query),self.get_stopfreq(query),self.get_nop(query))
+        sweep = (self.get_startfreq(query), self.get_stopfreq(query), self.get_nop(query))
+        if sweep != self._freqpoints[0]:
+            freqs = np.linspace(*sweep)
+            freqs.flags.writeable = False # shared between calls, callers scaling it have to copy first
+            self._freqpoints = (sweep, freqs)
+        return self._freqpoints[1]
 
     def run_cont(self):
         self._visainstrument.write('init:cont on')
@@ -165,11 +315,47 @@ class RS_ZNB20(Instrument):
 #                  Write and Read from VISA
 #
 #########################################################
+    def _batched_query(self, cmds):
+        '''
+        Send several queries as one compound SCPI message
+        Input:
+            cmds (list of string): queries, without leading colon
+        Output:
+            list of string: the stripped reply to each query
+        '''
+        msg = ';'.join(cmd if cmd.startswith('*') else ':' + cmd for cmd in cmds)
+        return [res.strip() for res in self._visainstrument.query(msg).split(';')]
+
+    def _set_and_update(self, setting, value):
+        '''
+        Send a setting and read back the parameters it changes, in one compound SCPI message
+        Input:
+            setting (tuple): one of the _SET_* templates and the names of the float parameters it reads back
+            value (float): value to set
+        Output:
+            None
+        '''
+        template, dependents = setting
+        self._visainstrument.write_raw(template % value)
+        replies = self._visainstrument.read().split(';')
+        for name, reply in zip(dependents, replies):
+            self.update_value(name, float(reply))
+
+    def _fquery(self, cmd):
+        '''
+        Query a numeric value
+        Input:
+            cmd (string): query
+        Output:
+            value (float)
+        '''
+        return float(self._visainstrument.query(cmd))
+
     def tell(self, cmd):
         self._visainstrument.write(cmd)
     def query(self, cmd):
         res= self._visainstrument.query(cmd)
-        print res
+        logging.debug(__name__ + ' : %s -> %s' % (cmd, res))
         return res
 #########################################################
 #
@@ -186,9 +372,7 @@ class RS_ZNB20(Instrument):
         '''
         
         logging.info(__name__+' : Set the frequency of the intrument')
-        self._visainstrument.write('frequency:center '+str(centerfreq))
-        self.get_startfreq()
-        self.get_stopfreq()
+        self._set_and_update(self._SET_CENTERFREQ, centerfreq)
 
     def do_get_centerfreq(self):
         '''
@@ -200,7 +384,7 @@ class RS_ZNB20(Instrument):
         '''
         
         logging.info(__name__+' : Get the frequency of the intrument')
-        return self._visainstrument.query('frequency:center?')
+        return self._fquery('frequency:center?')
 
     def do_set_span(self, span=1.):
         '''
@@ -212,9 +396,7 @@ class RS_ZNB20(Instrument):
         '''
         
         logging.info(__name__+' : Set the frequency of the intrument')
-        self._visainstrument.write('frequency:span '+str(span))
-        self.get_startfreq()
-        self.get_stopfreq()
+        self._set_and_update(self._SET_SPAN, span)
 
 
     def do_get_span(self):
@@ -226,7 +408,7 @@ class RS_ZNB20(Instrument):
                 frequency (float): frequency at which the instrument has been tuned [Hz]
         '''      
         logging.info(__name__+' : Get the frequency of the intrument')
-        return self._visainstrument.query('frequency:span?')
+        return self._fquery('frequency:span?')
 
 
     def do_set_startfreq(self, startfreq=1.):
@@ -238,9 +420,7 @@ class RS_ZNB20(Instrument):
                 None
         '''      
         logging.info(__name__+' : Set the frequency of the intrument')
-        self._visainstrument.write('frequency:start '+str(startfreq))
-        self.get_centerfreq()
-        self.get_span()
+        self._set_and_update(self._SET_STARTFREQ, startfreq)
 
 
 
@@ -253,7 +433,7 @@ class RS_ZNB20(Instrument):
                 frequency (float): frequency at which the instrument has been tuned [Hz]
         '''       
         logging.info(__name__+' : Get the frequency of the intrument')
-        return self._visainstrument.query('frequency:start?')
+        return self._fquery('frequency:start?')
 
     def do_set_stopfreq(self, stopfreq=1.):
         '''
@@ -264,9 +444,7 @@ class RS_ZNB20(Instrument):
                 None
         '''       
         logging.info(__name__+' : Set the stop frequency of the intrument')
-        self._visainstrument.write('frequency:stop '+str(stopfreq))
-        self.get_centerfreq()
-        self.get_span()
+        self._set_and_update(self._SET_STOPFREQ, stopfreq)
 
 
     def do_get_stopfreq(self):
@@ -278,7 +456,7 @@ class RS_ZNB20(Instrument):
                 frequency (float): stop frequency at which the instrument has been tuned [Hz]
         '''       
         logging.info(__name__+' : Get the stop frequency of the intrument')
-        return self._visainstrument.query('frequency:stop?')
+        return self._fquery('frequency:stop?')
 
     def do_set_convoffset(self, convoffset):
         '''
@@ -292,6 +470,7 @@ class RS_ZNB20(Instrument):
         
         self._visainstrument.write('sour:freq2:conv:arb:ifr 1,1, {}, SWE'.format(convoffset))
         #time.sleep(0.5)
+        self._static.pop('convmode', None) # the instrument may have switched mode
         self.get_convmode()
 
 
@@ -325,7 +504,7 @@ class RS_ZNB20(Instrument):
                 None
         '''        
         logging.info(__name__+' : Set the power of the intrument')
-        self._visainstrument.write('source:power '+str(power))
+        self._visainstrument.write_raw(self._SET_POWER % power)
 
     def do_get_power(self):
         '''
@@ -336,7 +515,7 @@ class RS_ZNB20(Instrument):
                 power (float): power at which the instrument has been tuned [dBm]
         '''       
         logging.info(__name__+' : Get the power of the intrument')
-        return self._visainstrument.query('source:power?')
+        return self._fquery('source:power?')
 
 #########################################################
 #
@@ -353,8 +532,8 @@ class RS_ZNB20(Instrument):
                 None
         '''        
         logging.info(__name__+' : Set the averages of the intrument')
-        self._visainstrument.write('average:count '+str(averages))
-        if self.get_Average().upper() == 'ON':
+        stat = self._batched_query(['average:count '+str(averages), 'average?'])[0]
+        if int(stat) == 1:
             self._visainstrument.write('sens:sweep:count '+str(averages))
 
     def do_get_averages(self):
@@ -382,10 +561,10 @@ class RS_ZNB20(Instrument):
         else:
             raise ValueError('set_status(): can only set on or off')
         if status == 'ON':
-            self._visainstrument.write('sens:sweep:count '+str(self.get_averages()))
+            count = self.get_averages(query=False) # set through this driver, the cached value is current
         else:
-            self._visainstrument.write('sens:sweep:count 1')
-        self._visainstrument.write('average %s' % status)
+            count = 1
+        self._visainstrument.write('sens:sweep:count %s;:average %s' % (count, status))
         
 
     def do_get_Average(self):
@@ -435,7 +614,7 @@ class RS_ZNB20(Instrument):
         '''
         
         logging.info(__name__+' : Get the BW of the intrument')
-        return self._visainstrument.query('sens:band?')
+        return self._fquery('sens:band?')
 
 #########################################################
 #
@@ -465,7 +644,7 @@ class RS_ZNB20(Instrument):
         '''
         
         logging.info(__name__+' : Get the BW of the intrument')
-        return self._visainstrument.query('sens:sweep:points?')
+        return int(self._fquery('sens:sweep:points?'))
                 
 #########################################################
 #
@@ -589,15 +768,14 @@ class RS_ZNB20(Instrument):
             reference (string) : 'int' or 'ext'
         '''
         logging.debug(__name__ + ' : get reference')
-        stat = str(self._visainstrument.query('rosc?'))
+        if 'reference' in self._static:
+            return self._static['reference']
+        stat = str(self._visainstrument.query('rosc?')).strip().upper()
 
-        if (stat=='INT\n'):
-          return 'INT'
-        elif (stat=='EXT\n'):
-          return 'EXT'
-        else:
+        if stat not in ('INT', 'EXT'):
           raise ValueError('Reference not specified : %s' % stat)
-        return
+        self._static['reference'] = stat
+        return stat
 
     def do_set_reference(self, status='EXT'):
         '''
@@ -613,6 +791,7 @@ class RS_ZNB20(Instrument):
         else:
             raise ValueError('set_reference(): can only set int or ext')
         self._visainstrument.write('ROSC %s' % status)
+        self._static['reference'] = status
 
     def do_get_convmode(self):
         '''
@@ -623,15 +802,14 @@ class RS_ZNB20(Instrument):
             conv mode (string) : 'fund' or 'arb'
         '''
         logging.debug(__name__ + ' : get conversion mode')
-        stat = self._visainstrument.query('sense:freq:conv?')
+        if 'convmode' in self._static:
+            return self._static['convmode']
+        stat = self._visainstrument.query('sense:freq:conv?').strip().upper()
 
-        if (stat=='FUND\n'):
-          return 'FUND'
-        elif (stat=='ARB\n'):
-          return 'ARB'
-        else:
+        if stat not in ('FUND', 'ARB'):
           raise ValueError('Conversion mode not specified : %s' % stat)
-        return
+        self._static['convmode'] = stat
+        return stat
 
     def do_set_convmode(self, status='FUND'):
         '''
@@ -649,6 +827,7 @@ class RS_ZNB20(Instrument):
         if status=='FUND':
             self.set_convoffset(0)
         self._visainstrument.write('sense:freq:conv ' + status)
+        self._static['convmode'] = status
 
 ############################################################################
 #
@@ -679,14 +858,13 @@ class RS_ZNB20(Instrument):
         Output:
             None
         '''
-        listdiagtrac = self._visainstrument.query("disp:cat?") # get all traces
-        listdiagtrac = listdiagtrac.strip("'") # removes annoying '
-        diags = listdiagtrac.split(',')[0::2] # takes only diag numbers (not names)
+        if self._diags is None:
+            listdiagtrac = self._visainstrument.query("disp:cat?") # get all traces
+            listdiagtrac = listdiagtrac.strip().strip("'") # removes annoying '
+            self._diags = listdiagtrac.split(',')[0::2] # takes only diag numbers (not names)
         comstr = "disp:wind{}:trac:y:auto once"
-        for d in diags:
-            self._visainstrument.write(comstr.format(d))
         # for some mysterious undocumented reason, the continuous measurement stops after the auto scaling
-        self._visainstrument.write('initiate:cont on')
+        self._visainstrument.write(';:'.join([comstr.format(d) for d in self._diags] + ['initiate:cont on']))
 
     Autoscale = yscale_auto_alldiag
 
@@ -807,6 +985,7 @@ class RS_ZNB20(Instrument):
             IDN (string) 
         '''
         logging.debug(__name__ + ' : get status')
-        idn = self._visainstrument.query('*IDN?')
+        if 'identification' not in self._static:
+            self._static['identification'] = self._visainstrument.query('*IDN?')
 
-        return idn
+        return self._static['identification']
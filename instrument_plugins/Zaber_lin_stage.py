@@ -1,6 +1,7 @@
 # created by Amir and AmirAli
 
 from instrument import Instrument
+import qt
 import types
 import ctypes
 from zaber.serial import AsciiSerial, AsciiDevice, AsciiCommand, AsciiReply
@@ -32,40 +33,82 @@ class Zaber_lin_stage(Instrument):
 
         self.client = AsciiDevice(AsciiSerial("COM4"), device_number)
 
+    @property
+    def step_to_mm(self):
+        return self._step_to_mm
+
+    @step_to_mm.setter
+    def step_to_mm(self, step_to_mm):
+        self._step_to_mm = step_to_mm
+        self._steps_per_mm = 1. / step_to_mm
+
+    def mm_to_steps(self, distance):
+        # rounded rather than truncated, so repeated relative moves do not drift
+        return int(round(distance * self._steps_per_mm))
+
     def poll_until_idle(self):
-        reply = self.client.poll_until_idle()
+        # waits with qt.msleep so the QTlab GUI keeps running while the stage moves
+        delay = 0.005
+        while self.client.poll_status().device_status != 'IDLE':
+            qt.msleep(delay)
+            delay = min(delay * 2, 0.1)
 
     def home(self):
-        reply = self.client.home()
+        reply = self.client.send('home')
+        self.poll_until_idle()
 
     def move_rel(self, distance, blocking = True):
-        reply = self.client.move_rel(distance, blocking)
+        reply = self.client.move_rel(distance, False)
+        if blocking:
+            self.poll_until_idle()
 
     def move_rel_mm(self, distance, blocking = True):
-        reply = self.client.move_rel(int(distance/self.step_to_mm), blocking)
+        self.move_rel(self.mm_to_steps(distance), blocking)
 
     def move_abs(self, position, blocking = True):
-        reply = self.client.move_abs(position, blocking)
+        reply = self.client.move_abs(position, False)
+        if blocking:
+            self.poll_until_idle()
 
     def move_abs_mm(self, position, blocking = True):
-        reply = self.client.move_abs(int(position/self.step_to_mm), blocking)
+        self.move_abs(self.mm_to_steps(position), blocking)
 
     def move_vel(self, speed, blocking = False):
-        reply = self.client.move_vel(speed, blocking)
+        reply = self.client.move_vel(speed, False)
+        if blocking:
+            self.poll_until_idle()
 
     def move_vel_distance(self, vel, distance):
-        x0 = self.client.get_position()
-        speed = int(vel / self.step_to_mm)
-        d = int(distance / self.step_to_mm)
-        reply = self.client.move_vel(vel)
-        while(1):
-            x = self.client.get_position()
-            if(abs(x-x0)>d):
-                self.client.stop()
-                breaktnm
+        # a relative move capped at the requested speed, the controller stops it after the distance
+        speed = abs(self.mm_to_steps(vel))
+        d = abs(self.mm_to_steps(distance))
+        if vel < 0:
+            d = -d
+        cmds = ['get maxspeed', 'set maxspeed {}'.format(speed), 'move rel {}'.format(d)]
+        replies = self.client.send_many(cmds)
+        try:
+            self.check_replies(cmds, replies)
+            self.poll_until_idle()
+        finally:
+            # restored whenever the old maxspeed was read and the new one accepted, even if the move was rejected
+            if replies[0].reply_flag == 'OK' and replies[1].reply_flag == 'OK':
+                self.client.send('set maxspeed {}'.format(replies[0].data))
+
+    def send_sequence(self, cmds):
+        # all commands are written before the first reply is read, one serial round-trip for the whole sequence
+        replies = self.client.send_many(cmds)
+        self.check_replies(cmds, replies)
+        return replies
+
+    def check_replies(self, cmds, replies):
+        # the replies are already checked against device and axis by send_many, a rejected command raises
+        for cmd, reply in zip(cmds, replies):
+            if reply.reply_flag != 'OK':
+                raise RuntimeError('Zaber stage rejected "{}": {}'.format(cmd, str(reply).strip()))
 
     def stop(self):
-        reply = self.client.stop()
+        reply = self.client.send('stop')
+        self.poll_until_idle()
 
     def current_status(self):
         reply = self.client.get_status()
@@ -28,30 +28,37 @@ class trinamic_coupling(Instrument):
 
         motor = bus.get_motor(mid)
         self.motor = motor
+        # bound once here, the methods below are called in tight monitoring loops
+        self._axis = motor.axis
+        self._rotate_right = motor.rotate_right
+        self._rotate_left = motor.rotate_left
+        self._stop = motor.stop
+        self._move_relative = motor.move_relative
+        self._move_absolute = motor.move_absolute
 
     def set_speed(self, speed):
         self.speed = speed
 
     def rotate_right(self):
-        self.motor.rotate_right(self.speed)
+        self._rotate_right(self.speed)
 
     def rotate_left(self):
-        self.motor.rotate_left(self.speed)
+        self._rotate_left(self.speed)
 
     def stop(self):
-        self.motor.stop()
+        self._stop()
 
     def move_relative(self, position):
-        self.motor.move_relative(position)
+        self._move_relative(position)
         #while self.motor.axis.actual_position - self.motor.axis.target_position < 100:
          #   time.sleep(0.01)
 
     def move_absolute(self, position):
-        self.motor.move_absolute(position)
+        self._move_absolute(position)
 
     def remove(self):
         self.motor.bus.serial.close()
         Instrument.remove(self)
 
     def get_position(self):
-        return self.motor.axis.actual_position
+        return self._axis.actual_position
@@ -1,5 +1,5 @@
 from .asciiaxis import AsciiAxis
-from .asciidevice import AsciiDevice
+from .asciidevice import AsciiDevice, poll_devices_until_idle
 from .asciicommand import AsciiCommand
 from .asciireply import AsciiReply
 from .asciiserial import AsciiSerial
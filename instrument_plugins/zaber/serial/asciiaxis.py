@@ -75,7 +75,7 @@ class AsciiAxis(object):
         Returns: An AsciiReply object containing the reply received.
         """
         if isinstance(message, (str, bytes)):
-            message = AsciiCommand(message)
+            message = AsciiCommand.from_string(message)
 
         # Always send the AsciiCommand to *this* axis.
         message.axis_number = self.number
@@ -217,7 +217,7 @@ class AsciiAxis(object):
             A string containing either "BUSY" or "IDLE", depending on
             the response received from the axis.
         """
-        return self.send("").device_status
+        return self.parent._send_cached(self.number, "").device_status
 
 
     def get_position(self):
@@ -231,7 +231,7 @@ class AsciiAxis(object):
             A number representing the current device position in its native
             units of measure. See the device manual for unit conversions.
         """
-        return int(self.send("get pos").data)
+        return int(self.parent._send_cached(self.number, "get pos").data)
 
 
     def poll_until_idle(self):
@@ -5,6 +5,32 @@ import logging
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Commands which only read from a device, besides the empty status
+# query. Anything else may change its state.
+_READ_ONLY_COMMANDS = ("get ",)
+
+# encode() templates, by whether there is a message ID and/or data.
+_ENCODE_ID_DATA = b"/%d %d %d %s\r\n"
+_ENCODE_ID = b"/%d %d %d\r\n"
+_ENCODE_DATA = b"/%d %d %s\r\n"
+_ENCODE = b"/%d %d\r\n"
+
+
+def _is_integer(token):
+    """Tells whether int() would accept a command token, without
+    raising and catching a ValueError for the many tokens that are
+    words."""
+    if token[:1] in ("+", "-"):
+        token = token[1:]
+    return token.isdigit()
+
+
+def _mutates(data):
+    """Tells whether a command's data may change the device's state,
+    by whitelisting the commands known to only read from it."""
+    return not (not data or data == "get" or
+                data.startswith(_READ_ONLY_COMMANDS))
+
 
 class AsciiCommand(object):
     """Models a single command in Zaber's ASCII protocol.
@@ -26,6 +52,10 @@ class AsciiCommand(object):
             spaces. A data value of "" (the empty string) is valid,
             and is often used as a "get status" command to query
             whether a device is busy or idle.
+        mutates: False if data is a command which only reads from the
+            device, that is a "get" command or the empty status query,
+            and True for every other command. It is worked out once,
+            when the command is constructed.
     """
 
     def __init__(self, *args):
@@ -72,6 +102,9 @@ class AsciiCommand(object):
             TypeError: An argument was passed to the constructor which
                 was neither an integer nor a string.
         """
+        self.device_address = 0
+        self.axis_number = 0
+        self.message_id = None
         self.data = ''
         attributes = iter(["device_address", "axis_number", "message_id"])
         for arg in args:
@@ -97,33 +130,56 @@ class AsciiCommand(object):
 
                 tokens = arg.split(' ')
                 for i, token in enumerate(tokens):
-                    try:
-                        # As above: if data has already been found,
-                        # all remaining arguments/tokens are also data.
-                        if self.data:
-                            raise StopIteration
-                        num = int(token)  # Is it a number?
-                        next_attr = next(attributes)  # If it *is* a number...
-                        setattr(self, next_attr, num)  # ...set the next attribute.
-                    except (ValueError, StopIteration):
-                        # If token is not a number, or if we are out of
-                        # attributes, the remaining text is data.
-                        data = ' '.join(tokens[i:])
-                        self.data = ' '.join([self.data, data]) if self.data \
-                            else data
-                        break
+                    # As above: if data has already been found,
+                    # all remaining arguments/tokens are also data.
+                    if not self.data and _is_integer(token):
+                        next_attr = next(attributes, None)
+                        if next_attr is not None:  # If it *is* a number...
+                            setattr(self, next_attr, int(token))  # ...set the next attribute.
+                            continue
+                    # If token is not a number, or if we are out of
+                    # attributes, the remaining text is data.
+                    data = ' '.join(tokens[i:])
+                    self.data = ' '.join([self.data, data]) if self.data \
+                        else data
+                    break
             else:
                 raise TypeError("All arguments to AsciiCommand() must be "
                                 "either strings or integers. An argument of "
                                 "type {0:s} was passed.".format(str(type(arg))))
 
-        # Set remaining attributes.
-        if not hasattr(self, "device_address"):
-            self.device_address = 0
-        if not hasattr(self, "axis_number"):
-            self.axis_number = 0
-        if not hasattr(self, "message_id"):
-            self.message_id = None
+        self.mutates = _mutates(self.data)
+
+
+    @classmethod
+    def from_string(cls, message):
+        """Returns an AsciiCommand for a string or bytes message.
+
+        Args:
+            message: A string or bytes object, as accepted by the
+                constructor.
+
+        Notes:
+            A message which starts with a letter, such as "home" or
+            "move abs 10000", can not hold a device address or axis
+            number, so it is taken as data as a whole without being
+            split into tokens. Any other message is parsed by the
+            constructor as usual.
+
+        Returns:
+            A new AsciiCommand.
+        """
+        if isinstance(message, bytes) and not isinstance(message, str):
+            message = message.decode()
+        if not message[:1].isalpha():
+            return cls(message)
+        command = cls.__new__(cls)
+        command.device_address = 0
+        command.axis_number = 0
+        command.message_id = None
+        command.data = message.rstrip('\r\n')
+        command.mutates = _mutates(command.data)
+        return command
 
 
     def encode(self):
@@ -138,30 +194,17 @@ class AsciiCommand(object):
         """
         if self.message_id is not None:
             if self.data:
-                return "/{0:d} {1:d} {2:d} {3:s}\r\n".format(
-                    self.device_address,
-                    self.axis_number,
-                    self.message_id,
-                    self.data
-                ).encode()
-            else:
-                return "/{0:d} {1:d} {2:d}\r\n".format(
-                    self.device_address,
-                    self.axis_number,
-                    self.message_id
-                ).encode()
+                return _ENCODE_ID_DATA % (self.device_address,
+                                          self.axis_number,
+                                          self.message_id,
+                                          self.data.encode())
+            return _ENCODE_ID % (self.device_address, self.axis_number,
+                                 self.message_id)
 
         if self.data:
-            return "/{0:d} {1:d} {2:s}\r\n".format(
-                self.device_address,
-                self.axis_number,
-                self.data
-            ).encode()
-        else:
-            return "/{0:d} {1:d}\r\n".format(
-                self.device_address,
-                self.axis_number
-            ).encode()
+            return _ENCODE_DATA % (self.device_address, self.axis_number,
+                                   self.data.encode())
+        return _ENCODE % (self.device_address, self.axis_number)
 
 
     def __str__(self):
@@ -10,6 +10,9 @@ from .unexpectedreplyerror import UnexpectedReplyError
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# time.monotonic is not available on Python 2.
+_monotonic = getattr(time, "monotonic", time.time)
+
 
 class AsciiDevice(object):
     """Represents an ASCII device. It is safe to use in multi-threaded
@@ -18,8 +21,15 @@ class AsciiDevice(object):
     Attributes:
         port: The port to which this device is connected.
         address: The address of this device. 1-99.
+        cache_ttl: The number of seconds for which get_status() and
+            get_position() replies are reused, unless anything other
+            than a read-only command is written to the port in between,
+            by any path. Replies from a busy device are never reused.
+            Defaults to 0.05. Set it to 0 to always query the device.
     """
 
+    cache_ttl = 0.05
+
     def __init__(self, port, address):
         """
         Args:
@@ -35,6 +45,9 @@ class AsciiDevice(object):
             raise ValueError("Address must be between 1 and 99.")
         self.address = address
         self.port = port
+        self._reply_cache = {}
+        self._poll_bytes = {}
+        self._axes = {}
 
 
     def axis(self, number):
@@ -44,17 +57,23 @@ class AsciiDevice(object):
         Args:
             number: The number of the axis. 1-9.
 
+        Raises:
+            ValueError: The axis number was not between 1 and 9.
+
         Notes:
-            This function will always return a *new* AsciiAxis instance.
-            If you are working extensively with axes, you may want to
-            create just one set of AsciiAxis objects by directly using
-            the AsciiAxis constructor instead of this function to avoid
-            creating lots and lots of objects.
+            The AsciiAxis for each number is created on the first call
+            and the same instance is returned afterwards, so calling
+            this function in a loop does not create lots and lots of
+            objects.
 
         Returns:
-            A new AsciiAxis instance to represent the axis specified.
+            The AsciiAxis instance representing the axis specified.
         """
-        return AsciiAxis(self, number)
+        axis = self._axes.get(number)
+        if axis is None:
+            axis = AsciiAxis(self, number)
+            self._axes[number] = axis
+        return axis
 
 
     def send(self, message):
@@ -84,7 +103,7 @@ class AsciiDevice(object):
             An AsciiReply containing the reply received.
         """
         if isinstance(message, (str, bytes)):
-            message = AsciiCommand(message)
+            message = AsciiCommand.from_string(message)
 
         # Always send an AsciiCommand to *this* device.
         message.device_address = self.address
@@ -95,6 +114,56 @@ class AsciiDevice(object):
             self.port.write(message)
             reply = self.port.read()
 
+        self._check_reply(message, reply)
+        return reply
+
+
+    def send_many(self, messages):
+        """Sends several messages to the device, then waits for all of
+        their replies. Every message is written before the first reply
+        is read, so the batch costs one serial round-trip.
+
+        Args:
+            messages: A sequence of strings or AsciiCommands
+                representing the messages to be sent to the device.
+
+        Notes:
+            As with send(), every message is sent to this device, and
+            every reply is checked against its message.
+
+            The device handles the messages in order, and a new
+            movement command pre-empts one which is still running, so
+            this is meant for commands which are answered straight
+            away, such as settings and queries.
+
+        Raises:
+            UnexpectedReplyError: A reply received was not sent by
+                the expected device.
+
+        Returns:
+            A list with the AsciiReply received for each message, in
+            the same order as *messages*.
+        """
+        commands = []
+        for message in messages:
+            if isinstance(message, (str, bytes)):
+                message = AsciiCommand.from_string(message)
+            message.device_address = self.address
+            commands.append(message)
+
+        with self.port.lock:
+            for command in commands:
+                self.port.write(command)
+            replies = [self.port.read() for command in commands]
+
+        for command, reply in zip(commands, replies):
+            self._check_reply(command, reply)
+        return replies
+
+
+    def _check_reply(self, message, reply):
+        """Raises UnexpectedReplyError unless *reply* answers *message*
+        from this device."""
         if (reply.device_address != self.address or
                 reply.axis_number != message.axis_number or
                 reply.message_id != message.message_id):
@@ -103,7 +172,28 @@ class AsciiDevice(object):
                 "axis {1:d}".format(reply.device_address, reply.axis_number),
                 reply
             )
-        return reply
+
+
+    def send_nowait(self, message):
+        """Sends a message to the device without waiting for a reply.
+
+        Args:
+            message: A string or AsciiCommand representing the message
+                to be sent to the device.
+
+        Notes:
+            As with send(), the message is always sent to this device.
+            The reply is read and discarded before the next reply on
+            the same port, and logged as a warning if the command was
+            rejected. Several commands can therefore be written back to
+            back, with their acknowledgements read in one go later.
+        """
+        if isinstance(message, (str, bytes)):
+            message = AsciiCommand.from_string(message)
+
+        message.device_address = self.address
+
+        self.port.write_nowait(message)
 
 
     def poll_until_idle(self, axis_number=0):
@@ -120,17 +210,146 @@ class AsciiDevice(object):
             UnexpectedReplyError: The reply received was not sent by
                 the expected device.
 
+        Notes:
+            The delay between polls starts at 5 ms and doubles after
+            every busy reply, up to 100 ms, so short moves are noticed
+            quickly without flooding the port during long ones.
+
         Returns:
             An AsciiReply containing the last reply received.
         """
+        delay = 0.005
         while True:
-            reply = self.send(AsciiCommand(self.address, axis_number, ""))
+            reply = self.poll_status(axis_number)
             if reply.device_status == "IDLE":
                 break
-            time.sleep(0.05)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return reply
+
+
+    def poll_status(self, axis_number=0):
+        """Sends an empty status query to the device and waits for the
+        reply. Unlike get_status(), the reply is never cached.
+
+        Args:
+            axis_number: An optional integer between 0 and 9 specifying
+                the axis to query. Defaults to 0, the whole device.
+
+        Notes:
+            The encoded query is built on the first poll of each axis
+            and reused afterwards, so repeated polls, such as those in
+            a wait loop, allocate no AsciiCommand.
+
+        Raises:
+            UnexpectedReplyError: The reply received was not sent by
+                the expected device.
+
+        Returns:
+            An AsciiReply containing the reply received.
+        """
+        with self.port.lock:
+            self._write_poll(axis_number)
+            return self._read_poll(axis_number)
+
+
+    def _write_poll(self, axis_number):
+        """Writes the encoded status query for an axis to the port."""
+        data = self._poll_bytes.get(axis_number)
+        if data is None:
+            data = AsciiCommand(self.address, axis_number, "").encode()
+            self._poll_bytes[axis_number] = data
+        self.port.write_raw(data, mutates=False)
+
+
+    def _read_poll(self, axis_number):
+        """Reads and checks the reply to a query from _write_poll()."""
+        reply = self.port.read()
+        if (reply.device_address != self.address or
+                reply.axis_number != axis_number or
+                reply.message_id is not None):
+            raise UnexpectedReplyError(
+                "Received an unexpected reply from device with address {0:d}, "
+                "axis {1:d}".format(reply.device_address, reply.axis_number),
+                reply
+            )
         return reply
 
 
+    def poll_axes(self, axis_numbers):
+        """Queries the status of several axes at once. All queries are
+        written before any reply is read, so the whole batch costs one
+        serial round-trip instead of one per axis.
+
+        Args:
+            axis_numbers: A sequence of up to 100 integers, each between
+                0 and 9, specifying the axes to query.
+
+        Raises:
+            UnexpectedReplyError: A reply received was not sent by the
+                expected device, or did not answer one of the queries.
+
+        Returns:
+            A dict mapping each axis number to the AsciiReply received
+            for it.
+        """
+        commands = [AsciiCommand(self.address, axis_number, message_id, "")
+                    for message_id, axis_number in enumerate(axis_numbers)]
+
+        with self.port.lock:
+            for command in commands:
+                self.port.write(command)
+            replies = [self.port.read() for command in commands]
+
+        by_id = dict((reply.message_id, reply) for reply in replies)
+        result = {}
+        for command in commands:
+            reply = by_id.get(command.message_id)
+            if (reply is None or
+                    reply.device_address != self.address or
+                    reply.axis_number != command.axis_number):
+                raise UnexpectedReplyError(
+                    "Received an unexpected reply while polling device "
+                    "with address {0:d}, axis {1:d}".format(
+                        self.address, command.axis_number),
+                    reply
+                )
+            result[command.axis_number] = reply
+        return result
+
+
+    def poll_axes_until_idle(self, axis_numbers):
+        """Polls several axes together, blocking until all of them are
+        idle. Each round queries the axes which are still busy with
+        poll_axes(), backing off like poll_until_idle().
+
+        Args:
+            axis_numbers: A sequence of integers, each between 0 and 9,
+                specifying the axes to wait for.
+
+        Raises:
+            UnexpectedReplyError: A reply received was not sent by the
+                expected device.
+
+        Returns:
+            A dict mapping each axis number to the last AsciiReply
+            received for it.
+        """
+        last = {}
+        busy = list(axis_numbers)
+        delay = 0.005
+        while True:
+            replies = self.poll_axes(busy)
+            last.update(replies)
+            busy = [axis_number for axis_number in busy
+                    if replies[axis_number].device_status != "IDLE"]
+            if not busy:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return last
+
+
     def home(self):
         """Sends the "home" command, then polls the device until it is
         idle.
@@ -152,19 +371,22 @@ class AsciiDevice(object):
                 microsteps to which to move the device.
             blocking: An optional boolean, True by default. If set to
                 False, this function will return immediately after
-                receiving a reply from the device and it will not poll
-                the device further.
+                writing the command, without waiting for the device's
+                reply, and it will not poll the device further.
 
         Raises:
             UnexpectedReplyError: The reply received was not sent by
                 the expected device.
 
         Returns:
-            An AsciiReply containing the first reply received.
+            An AsciiReply containing the first reply received, or None
+            if blocking is False.
         """
+        if not blocking:
+            self.send_nowait("move abs {0:d}".format(position))
+            return None
         reply = self.send("move abs {0:d}".format(position))
-        if blocking:
-            self.poll_until_idle()
+        self.poll_until_idle()
         return reply
 
 
@@ -177,19 +399,22 @@ class AsciiDevice(object):
                 by which to move the device.
             blocking: An optional boolean, True by default. If set to
                 False, this function will return immediately after
-                receiving a reply from the device, and it will not poll
-                the device further.
+                writing the command, without waiting for the device's
+                reply, and it will not poll the device further.
 
         Raises:
             UnexpectedReplyError: The reply received was not sent by
                 the expected device.
 
         Returns:
-            An AsciiReply containing the first reply received.
+            An AsciiReply containing the first reply received, or None
+            if blocking is False.
         """
+        if not blocking:
+            self.send_nowait("move rel {0:d}".format(distance))
+            return None
         reply = self.send("move rel {0:d}".format(distance))
-        if blocking:
-            self.poll_until_idle()
+        self.poll_until_idle()
         return reply
 
 
@@ -207,19 +432,23 @@ class AsciiDevice(object):
         Notes:
             Unlike the other two move commands, move_vel() does not by
             default poll the device until it is idle. move_vel() will
-            return immediately after receiving a response from the
-            device unless the "blocking" argument is set to True.
+            return immediately after writing the command, without
+            waiting for the device's reply, unless the "blocking"
+            argument is set to True.
 
         Raises:
             UnexpectedReplyError: The reply received was not sent by
                 the expected device.
 
         Returns:
-            An AsciiReply containing the first reply received.
+            An AsciiReply containing the first reply received, or None
+            if blocking is False.
         """
+        if not blocking:
+            self.send_nowait("move vel {0:d}".format(speed))
+            return None
         reply = self.send("move vel {0:d}".format(speed))
-        if blocking:
-            self.poll_until_idle()
+        self.poll_until_idle()
         return reply
 
 
@@ -253,7 +482,7 @@ class AsciiDevice(object):
             A string containing either "BUSY" or "IDLE", depending on
             the response received from the device.
         """
-        return self.send("").device_status
+        return self._send_cached(0, "").device_status
 
 
     def get_position(self):
@@ -269,9 +498,96 @@ class AsciiDevice(object):
             If this command is used on a multi-axis device, the return value
             is the position of the first axis.
         """
-        data = self.send("get pos").data
+        data = self._send_cached(0, "get pos").data
         if (" " in data):
             data = data.split(" ")[0]
 
         return int(data)
 
+
+    def _send_cached(self, axis_number, data):
+        """Sends a read-only command to the device, or returns the
+        reply to the same command if it was received less than
+        *cache_ttl* seconds ago, the device was not busy, and nothing
+        which may change a device was written to the port since.
+
+        Args:
+            axis_number: The integer number of the axis to query.
+            data: A string containing the command.
+
+        Raises:
+            UnexpectedReplyError: The reply received was not sent by
+                the expected device.
+
+        Returns:
+            An AsciiReply containing the reply received.
+        """
+        key = (axis_number, data)
+        now = _monotonic()
+        # Taken before sending, so a write racing with this query makes
+        # the cached reply count as stale.
+        generation = self.port.generation
+        cached = self._reply_cache.get(key)
+        if (cached is not None and now - cached[1] < self.cache_ttl and
+                cached[2] == generation):
+            return cached[0]
+        reply = self.send(AsciiCommand(self.address, axis_number, data))
+        # The position and status of a moving device are out of date
+        # straight away, so those replies are not kept.
+        if reply.device_status == "BUSY":
+            self._reply_cache.pop(key, None)
+        else:
+            self._reply_cache[key] = (reply, now, generation)
+        return reply
+
+
+def poll_devices_until_idle(devices, axis_number=0):
+    """Polls several devices, blocking until all of them are idle.
+
+    Each round writes a status query to every device which is still
+    busy before reading any reply, so devices on different ports are
+    polled concurrently from the calling thread, and the round costs
+    about one round-trip rather than one per device. Rounds back off
+    like AsciiDevice.poll_until_idle().
+
+    Args:
+        devices: A sequence of AsciiDevice objects. They may share a
+            port or be on separate ports.
+        axis_number: An optional integer between 0 and 9 specifying the
+            axis whose status to poll on every device. Defaults to 0,
+            which reports a device as busy if any of its axes moves.
+
+    Raises:
+        UnexpectedReplyError: A reply received was not sent by the
+            expected device.
+
+    Returns:
+        A list with the last AsciiReply received from each device, in
+        the same order as *devices*.
+    """
+    last = [None] * len(devices)
+    busy = list(range(len(devices)))
+    delay = 0.005
+    while True:
+        # Take the port locks in a fixed order, so two threads polling
+        # overlapping sets of ports can not deadlock.
+        locks = dict((id(devices[i].port.lock), devices[i].port.lock)
+                     for i in busy)
+        held = [locks[key] for key in sorted(locks)]
+        for lock in held:
+            lock.acquire()
+        try:
+            for i in busy:
+                devices[i]._write_poll(axis_number)
+            for i in busy:
+                last[i] = devices[i]._read_poll(axis_number)
+        finally:
+            for lock in reversed(held):
+                lock.release()
+
+        busy = [i for i in busy if last[i].device_status != "IDLE"]
+        if not busy:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    return last
@@ -1,11 +1,30 @@
 import logging
-import re
 
 # See https://docs.python.org/2/howto/logging.html#configuring-logging-
 # for-a-library for info on why we have these two lines here.
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Error messages for replies which can not be parsed, by message type.
+_PARSE_ERRORS = {
+    '@': "Failed to parse reply: {}",
+    '#': "Failed to parse info message: {}",
+    '!': "Failed to parse alert: {}",
+}
+
+# Two-digit hex strings for every checksum byte, formatted once.
+_CHECKSUM_HEX = ["{:02X}".format(i) for i in range(256)]
+
+
+def _split_fields(text, count):
+    """Splits text into *count* space-separated fields, the last of
+    which takes the remainder. Returns None unless there are exactly
+    that many fields and none of them is empty."""
+    fields = text.split(' ', count - 1)
+    if len(fields) != count or not all(fields):
+        return None
+    return fields
+
 
 class AsciiReply(object):
     """Models a single reply in Zaber's ASCII protocol.
@@ -42,13 +61,20 @@ class AsciiReply(object):
         Protocol_Manual#Warning_Flags
     """
 
+    # One AsciiReply is created for every line read from the port, so
+    # it has fixed slots instead of a per-instance __dict__.
+    __slots__ = ("message_type", "device_address", "axis_number",
+                 "message_id", "reply_flag", "device_status",
+                 "warning_flag", "data", "checksum")
+
     def __init__(self, reply_string):
         """
         Args:
             reply_string: A string in one of the formats described in
                 Zaber's `Ascii Protocol Manual`_. It will be parsed by
                 this constructor in order to populate the attributes of
-                the new AsciiReply.
+                the new AsciiReply. The raw bytes read from a port are
+                also accepted; the attributes are strings either way.
 
         Raises:
             ValueError: The string could not be parsed.
@@ -56,7 +82,17 @@ class AsciiReply(object):
         .. _Ascii Protocol Manual: http://www.zaber.com/wiki/Manuals/AS
             CII_Protocol_Manual
         """
-        reply_string = reply_string.strip("\r\n")
+        raw = None
+        if isinstance(reply_string, bytes) and not isinstance(reply_string,
+                                                              str):
+            # Bytes from AsciiSerial.read(). Keep them for the checksum,
+            # which then needs no re-encoding, and decode the text once.
+            raw = reply_string.strip(b"\r\n")
+            reply_string = raw.decode()
+        elif (reply_string[-1:] in ("\r", "\n") or
+                reply_string[:1] in ("\r", "\n")):
+            # Only make a stripped copy when there is something to strip.
+            reply_string = reply_string.strip("\r\n")
 
         if len(reply_string) < 5:
             raise ValueError("Reply string too short to be a valid reply.")
@@ -66,16 +102,15 @@ class AsciiReply(object):
         if reply_string[-3] == ':':
             self.checksum = reply_string[-2:]
             reply_string = reply_string[:-3]
-            # Test checksum
-            sum = 0
-            for ch in reply_string[1:]:
-                try:
-                    sum += ord(ch)
-                except TypeError:
-                    sum += ch  # bytes() elements are ints.
-            # Truncate to last byte and XOR + 1, as per the LRC.
-            # Convert to HEX but keep only last 2 digits, left padded by 0's
-            correct_checksum = "{:02X}".format(((sum & 0xFF) ^ 0xFF) + 1)[-2:]
+            # Test checksum. bytearray() yields ints on both Python 2
+            # and 3, so the builtin sum() does the whole loop in C.
+            if raw is not None:
+                total = sum(bytearray(raw[1:-3]))
+            else:
+                total = sum(bytearray(reply_string[1:].encode("ascii")))
+            # Truncate to last byte and XOR + 1, as per the LRC. Modulo
+            # 256 that is the two's complement of the sum.
+            correct_checksum = _CHECKSUM_HEX[-total & 0xFF]
             if self.checksum != correct_checksum:
                 raise ValueError(
                     "Checksum incorrect. Found {:s}, expected {:s}. Possible "
@@ -95,49 +130,69 @@ class AsciiReply(object):
         self.warning_flag = None
         self.data = None
 
+        # Nearly every message is a reply without a message ID and with
+        # one word of data, such as "@01 0 OK IDLE -- 0". Take those
+        # apart with a single split before trying the general parse.
+        if '@' == self.message_type:
+            fields = reply_string.split(' ')
+            if (len(fields) == 6 and all(fields) and
+                    fields[0][1:].isdigit() and fields[1].isdigit()):
+                self.device_address = int(fields[0][1:])
+                self.axis_number = int(fields[1])
+                (self.reply_flag, self.device_status, self.warning_flag,
+                 self.data) = fields[2:]
+                return
+
+        if self.message_type not in _PARSE_ERRORS:
+            raise ValueError("Invalid response type: {}".format(self.message_type))
+        error = _PARSE_ERRORS[self.message_type]
+
+        # Replies are space-separated fields, so str.split() does the
+        # parsing. All types start with the device address and axis.
+        head = reply_string[1:].split(' ', 2)
+        if len(head) < 3 or not (head[0].isdigit() and head[1].isdigit()):
+            raise ValueError(error.format(reply_string))
+        self.device_address = int(head[0])
+        self.axis_number = int(head[1])
+        rest = head[2]
+
         # @ is the "Reply" type
         if ('@' == self.message_type):
-            match = re.match("@(\d+)\s(\d+)\s(?:(\d+)\s)?(\S+)\s(\S+)\s(\S+)\s(.+)", reply_string)
-            if (not match):
-                raise ValueError("Failed to parse reply: {}".format(reply_string))
+            # An optional message ID comes before the four reply fields.
+            fields = None
+            message_id, _, tail = rest.partition(' ')
+            if message_id.isdigit():
+                fields = _split_fields(tail, 4)
+                if fields is not None:
+                    self.message_id = int(message_id)
+            if fields is None:
+                fields = _split_fields(rest, 4)
+            if fields is None:
+                raise ValueError(error.format(reply_string))
 
-            self.device_address = int(match.group(1))
-            self.axis_number = int(match.group(2))
-            if (match.group(3) is not None):
-                self.message_id = int(match.group(3))
-            self.reply_flag = match.group(4)
-            self.device_status = match.group(5)
-            self.warning_flag = match.group(6)
-            self.data = match.group(7) or ""
+            (self.reply_flag, self.device_status, self.warning_flag,
+             self.data) = fields
 
 
         # # is the "Info" type
         elif ('#' == self.message_type):
-            match = re.match("#(\d+)\s(\d+)\s(?:(\d+)\s)?(.*)", reply_string)
-            if (not match):
-                raise ValueError("Failed to parse info message: {}".format(reply_string))
-
-            self.device_address = int(match.group(1))
-            self.axis_number = int(match.group(2))
-            if (match.group(3) is not None):
-                self.message_id = int(match.group(3))
-            self.data = match.group(4) or ""
+            message_id, separator, tail = rest.partition(' ')
+            if separator and message_id.isdigit():
+                self.message_id = int(message_id)
+                self.data = tail
+            else:
+                self.data = rest
 
 
         # ! is the "Alert" type
-        elif ('!' == self.message_type):
-            match = re.match("!(\d+)\s(\d+)\s(\S+)\s(\S+)(?:\s(.*))?", reply_string)
-            if (not match):
-                raise ValueError("Failed to parse alert: {}".format(reply_string))
-
-            self.device_address = int(match.group(1))
-            self.axis_number = int(match.group(2))
-            self.device_status = match.group(3)
-            self.warning_flag = match.group(4)
-            self.data = match.group(5) or ""
-
         else:
-            raise ValueError("Invalid response type: {}".format(self.message_type))
+            fields = rest.split(' ', 2)
+            if len(fields) < 2 or not (fields[0] and fields[1]):
+                raise ValueError(error.format(reply_string))
+
+            self.device_status = fields[0]
+            self.warning_flag = fields[1]
+            self.data = fields[2] if len(fields) > 2 else ""
 
 
     def encode(self):
@@ -154,55 +209,40 @@ class AsciiReply(object):
         retstr = ""
         if self.message_type == '@':
             if self.message_id is None:
-                retstr = "@{:02d} {:d} {:s} {:s} {:s} {:s}".format(
-                    self.device_address,
-                    self.axis_number,
-                    self.reply_flag,
-                    self.device_status,
-                    self.warning_flag,
-                    self.data
-                )
+                retstr = "@%02d %d %s %s %s %s" % (
+                    self.device_address, self.axis_number, self.reply_flag,
+                    self.device_status, self.warning_flag, self.data)
             else:
-                retstr = "@{:02d} {:d} {:02d} {:s} {:s} {:s} {:s}".format(
-                    self.device_address,
-                    self.axis_number,
-                    self.message_id,
-                    self.reply_flag,
-                    self.device_status,
-                    self.warning_flag,
-                    self.data
-                )
+                retstr = "@%02d %d %02d %s %s %s %s" % (
+                    self.device_address, self.axis_number, self.message_id,
+                    self.reply_flag, self.device_status, self.warning_flag,
+                    self.data)
 
         elif self.message_type == '#':
             if self.message_id is None:
-                retstr = "#{:02d} {:d} {:s}".format(self.device_address,
-                                                    self.axis_number,
-                                                    self.data)
+                retstr = "#%02d %d %s" % (self.device_address,
+                                          self.axis_number, self.data)
             else:
-                retstr = "#{:02d} {:d} {:02d} {:s}".format(self.device_address,
-                                                           self.axis_number,
-                                                           self.message_id,
-                                                           self.data)
+                retstr = "#%02d %d %02d %s" % (self.device_address,
+                                               self.axis_number,
+                                               self.message_id, self.data)
 
         elif self.message_type == '!':
             if self.message_id is None:
-                retstr = "!{:02d} {:d} {:s} {:s}".format(self.device_address,
-                                                         self.axis_number,
-                                                         self.device_status,
-                                                         self.warning_flag)
+                retstr = "!%02d %d %s %s" % (self.device_address,
+                                             self.axis_number,
+                                             self.device_status,
+                                             self.warning_flag)
             else:
-                retstr = "!{:02d} {:d} {:02d} {:s} {:s}".format(
-                    self.device_address,
-                    self.axis_number,
-                    self.message_id,
-                    self.device_status,
-                    self.warning_flag
-                )
+                retstr = "!%02d %d %02d %s %s" % (self.device_address,
+                                                  self.axis_number,
+                                                  self.message_id,
+                                                  self.device_status,
+                                                  self.warning_flag)
 
         if self.checksum is not None:
-            return "{:s}:{:s}\r\n".format(retstr, self.checksum)
-        else:
-            return "{:s}\r\n".format(retstr)
+            return retstr + ":" + self.checksum + "\r\n"
+        return retstr + "\r\n"
 
 
     def __str__(self):
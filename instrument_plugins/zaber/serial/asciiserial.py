@@ -11,6 +11,8 @@ from .timeouterror import TimeoutError
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+_VALID_BAUDS = frozenset([115200, 57600, 38400, 19200, 9600])
+
 
 class AsciiSerial(object):
     """A class for interacting with Zaber devices using the ASCII protocol. It
@@ -27,10 +29,16 @@ class AsciiSerial(object):
             value of 0 specifies that all reads and writes should be
             non-blocking (return immediately without waiting). Defaults
             to 5.
+        generation: An integer counting the writes to this port which may
+            have changed the state of a device: every command which
+            mutates (see AsciiCommand), and every write_raw() not
+            marked as read-only. AsciiDevice compares it to drop
+            cached replies, whichever path the write took.
         lock: The threading.RLock guarding the port. Each method takes the lock
             and is therefore thread safe. However, to ensure no other threads
             access the port across multiple method calls, the caller should
-            acquire the lock.
+            acquire the lock. It has to be reentrant, because callers such
+            as AsciiDevice.send() hold it while calling write() and read().
     """
     def __init__(self, port, baud=115200, timeout=5, inter_char_timeout=0.5):
         """
@@ -69,6 +77,11 @@ class AsciiSerial(object):
             self._ser = serial.Serial(port, baud, timeout=timeout,
                                       interCharTimeout=inter_char_timeout)
         self._lock = RLock()
+        self._buffer = bytearray()
+        # in_waiting replaced inWaiting() in pyserial 3.0.
+        self._has_in_waiting = hasattr(self._ser, "in_waiting")
+        self._unread_replies = 0
+        self._generation = 0
 
 
     def write(self, command):
@@ -84,7 +97,8 @@ class AsciiSerial(object):
         if not isinstance(command, AsciiCommand):
             raise TypeError("write must be passed a string or AsciiCommand.")
 
-        logger.debug("> %s", command)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("> %s", command)
 
         # From "Porting Python 2 Code to Python 3":
         # "...when you receive text in binary data, you should
@@ -96,9 +110,44 @@ class AsciiSerial(object):
         # See https://docs.python.org/3/howto/pyporting.html#text-versu
         # s-binary-data
         with self._lock:
+            if command.mutates:
+                self._generation += 1
             self._ser.write(command.encode())
 
 
+    def write_nowait(self, command):
+        """Writes a command to the serial port without waiting for its
+        reply. The reply is read and discarded by the next read(), so
+        the caller does not pay a round-trip for the acknowledgement.
+
+        Args:
+            command: A string or AsciiCommand representing a command
+                to be sent.
+        """
+        with self._lock:
+            self.write(command)
+            self._unread_replies += 1
+
+
+    def write_raw(self, data, mutates=True):
+        """Writes an already encoded command to the serial port.
+
+        Args:
+            data: A bytes object holding one or more complete commands,
+                as returned by AsciiCommand.encode().
+            mutates: False if none of the commands can change the state
+                of a device, so cached replies stay valid. Since the
+                bytes are not parsed, defaults to True.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("> %s", data.rstrip(b"\r\n"))
+
+        with self._lock:
+            if mutates:
+                self._generation += 1
+            self._ser.write(data)
+
+
     def read(self):
         """Reads a reply from the serial port.
 
@@ -108,19 +157,65 @@ class AsciiSerial(object):
             ValueError: The reply read could not be parsed and is
                 invalid.
 
+        Notes:
+            Rather than reading one byte at a time until a newline, as
+            readline() does, this waits for the first byte and then
+            takes everything the driver has buffered in one call. Bytes
+            after the newline are kept for the next read, so replies to
+            pipelined commands cost one read each at most.
+
         Returns:
             An `AsciiReply` containing the reply received.
         """
         with self._lock:
-            line = self._ser.readline()
+            while self._unread_replies:
+                self._unread_replies -= 1
+                self._discard_reply()
+            line = self._read_line()
 
         if not line:
             logger.debug("< Receive timeout!")
             raise TimeoutError("read timed out.")
 
-        decoded_line = line.decode()
-        logger.debug("< %s", decoded_line.rstrip("\r\n"))
-        return AsciiReply(decoded_line)
+        line = line.rstrip(b"\r\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("< %s", line.decode())
+        return AsciiReply(line)
+
+
+    def _discard_reply(self):
+        """Reads the reply to a command sent with write_nowait(), logging
+        it if the command was rejected."""
+        line = self._read_line()
+        if not line:
+            logger.debug("< Receive timeout!")
+            raise TimeoutError("read timed out.")
+        reply = AsciiReply(line.rstrip(b"\r\n"))
+        if reply.reply_flag != "OK":
+            logger.warning("Command sent without waiting was rejected: %s",
+                           reply)
+        else:
+            logger.debug("< %s", reply)
+
+
+    def _read_line(self):
+        """Returns the next newline-terminated line from the port, or
+        whatever was received before a read timed out."""
+        buf = self._buffer
+        end = buf.find(b"\n")
+        while end < 0:
+            chunk = self._ser.read(self._in_waiting() or 1)
+            if not chunk:
+                line = bytes(buf)
+                del buf[:]
+                return line
+            start = len(buf)
+            buf += chunk
+            end = buf.find(b"\n", start)
+        # Lines are taken off the front of the one bytearray in place.
+        line = bytes(buf[:end + 1])
+        del buf[:end + 1]
+        return line
 
 
     def can_read(self):
@@ -131,13 +226,31 @@ class AsciiSerial(object):
         still possible for the next read call to block waiting for data, and
         it's still possible to time out if transmission was interrupted.
 
+        Replies to commands sent with write_nowait() are not counted: those
+        already received are discarded here, and while any are still
+        outstanding this returns False.
+
         Returns:
             True if data is available to read; False otherwise.
         """
-        if (hasattr(self._ser, "in_waiting")):
-            return (self._ser.in_waiting > 0)
+        with self._lock:
+            while self._unread_replies:
+                waiting = self._in_waiting()
+                if waiting:
+                    self._buffer += self._ser.read(waiting)
+                if b"\n" not in self._buffer:
+                    return False
+                self._unread_replies -= 1
+                self._discard_reply()
+            return bool(self._buffer) or self._in_waiting() > 0
+
+
+    def _in_waiting(self):
+        """Returns the number of bytes the driver has received."""
+        if self._has_in_waiting:
+            return self._ser.in_waiting
         else:
-            return (self._ser.inWaiting() > 0)
+            return self._ser.inWaiting()
 
 
     def flush(self):
@@ -163,8 +276,7 @@ class AsciiSerial(object):
 
 
     def __exit__(self, exc_type, exc_value, traceback):
-        with self._lock:
-            self.close()
+        self.close()
 
 
     @property
@@ -172,6 +284,11 @@ class AsciiSerial(object):
         return self._lock
 
 
+    @property
+    def generation(self):
+        return self._generation
+
+
     @property
     def timeout(self):
         with self._lock:
@@ -193,7 +310,7 @@ class AsciiSerial(object):
     @baudrate.setter
     def baudrate(self, b):
         with self._lock:
-            if b not in (115200, 57600, 38400, 19200, 9600):
+            if b not in _VALID_BAUDS:
                 raise ValueError(
                     "Invalid baud rate: {:d}. Valid baud rates are 115200, "
                     "57600, 38400, 19200, and 9600.".format(b)
@@ -6,6 +6,12 @@ import struct
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# The 6-byte frame: device number, command number, 32-bit data.
+_FRAME = struct.Struct("<2Bl")
+# The same frame with a message ID in place of the top data byte: the
+# low 16 bits of data, the next 8 bits of data, then the message ID.
+_FRAME_ID = struct.Struct("<2BHBB")
+
 
 class BinaryCommand(object):
     """Models a single command in Zaber's Binary protocol.
@@ -27,6 +33,9 @@ class BinaryCommand(object):
     .. _message ID: http://www.zaber.com/wiki/Manuals/Binary_Protocol_Ma
         nual#Set_Message_Id_Mode_-_Cmd_102
     """
+
+    __slots__ = ("device_number", "command_number", "data", "message_id")
+
     def __init__(self, device_number, command_number, data=0,
                  message_id=None):
         """
@@ -45,10 +54,12 @@ class BinaryCommand(object):
         Raises:
             ValueError: An invalid value was passed.
         """
-        if device_number < 0 or command_number < 0:
+        if not (0 <= device_number <= 255 and 0 <= command_number <= 255):
             raise ValueError(
                 "Device and command number must be between 0 and 255."
             )
+        if not -2**31 <= data < 2**31:
+            raise ValueError("Data must fit in a signed 32-bit integer.")
         self.device_number = device_number
         self.command_number = command_number
         self.data = data
@@ -64,13 +75,15 @@ class BinaryCommand(object):
             A byte string of length 6, formatted according to Zaber's
             `Binary Protocol Manual`_.
         """
-        packed = struct.pack("<2Bl",
-                             self.device_number,
-                             self.command_number,
-                             self.data)
-        if self.message_id is not None:
-            packed = packed[:5] + struct.pack("B", self.message_id)
-        return packed
+        if self.message_id is None:
+            return _FRAME.pack(self.device_number,
+                               self.command_number,
+                               self.data)
+        return _FRAME_ID.pack(self.device_number,
+                              self.command_number,
+                              self.data & 0xFFFF,
+                              (self.data >> 16) & 0xFF,
+                              self.message_id)
 
 
     def __str__(self):
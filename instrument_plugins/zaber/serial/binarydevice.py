@@ -1,6 +1,7 @@
 import logging
 
 from .binarycommand import BinaryCommand
+from .binaryreply import BinaryReply
 from .unexpectedreplyerror import UnexpectedReplyError
 
 # See https://docs.python.org/2/howto/logging.html#configuring-logging-
@@ -32,6 +33,7 @@ class BinaryDevice(object):
             raise ValueError("Device number must be 1-255.")
         self.number = number
         self.port = port
+        self._encoded = {}
 
 
     def send(self, *args):
@@ -92,13 +94,61 @@ class BinaryDevice(object):
         return reply
 
 
+    def send_many(self, commands):
+        """Sends several commands to this device in one write, then
+        reads all of their replies in one read.
+
+        Args:
+            commands: A sequence of BinaryCommand objects.
+
+        Notes:
+            As with send(), the device number of every command is
+            overwritten with the number of this device.
+
+            The device handles the commands in order, and a new
+            movement command pre-empts one which is still running, so
+            this is meant for commands which are answered straight
+            away, such as settings and queries.
+
+        Raises:
+            UnexpectedReplyError: A reply read was not sent by this
+                device, or its message ID (if in use) did not match the
+                message ID of its command.
+
+        Returns:
+            A list with the BinaryReply received for each command, in
+            the same order as *commands*.
+        """
+        for command in commands:
+            command.device_number = self.number
+        data = b"".join(command.encode() for command in commands)
+
+        with self.port.lock:
+            self.port.write_raw(data)
+            data = self.port.read_raw(len(commands))
+
+        replies = []
+        for i, command in enumerate(commands):
+            reply = BinaryReply.from_bytes(data[6 * i:6 * i + 6],
+                                           command.message_id is not None)
+            if ((reply.device_number != self.number)
+                or ((reply.message_id or 0) != (command.message_id or 0))):
+                raise UnexpectedReplyError(
+                    "Received an unexpected reply from device number "
+                    "{0:d}".format(reply.device_number),
+                    reply
+                )
+            replies.append(reply)
+        return replies
+
+
     def home(self):
         """Sends the "home" command (1), then waits for the device to
         reply.
 
         Returns: A BinaryReply containing the reply received.
         """
-        return self.send(1)
+        return self._send_bare(1)
 
 
     def move_abs(self, position):
@@ -149,7 +199,7 @@ class BinaryDevice(object):
 
         Returns: A BinaryReply containing the reply received.
         """
-        return self.send(23)
+        return self._send_bare(23)
 
 
     def get_status(self):
@@ -163,7 +213,7 @@ class BinaryDevice(object):
         .. _status code: http://www.zaber.com/wiki/Manuals/Binary_Protoc
             ol_Manual#Return_Status_-_Cmd_54
         """
-        return self.send(54).data
+        return self._send_bare(54).data
 
 
     def get_position(self):
@@ -174,4 +224,37 @@ class BinaryDevice(object):
             An integer representing the device's current position, it its
             native units of measure - see the device manual for unit conversions.
         """
-        return self.send(60).data
+        return self._send_bare(60).data
+
+
+    def _send_bare(self, command_number):
+        """Sends a command with no data and no message ID, then waits
+        for the reply. The encoded command is built on the first call
+        for each device and command number and reused afterwards.
+
+        Raises:
+            UnexpectedReplyError: The reply read was not sent by this
+                device.
+
+        Returns: A BinaryReply containing the reply received.
+        """
+        # The device number is part of the key, as it is encoded in
+        # the frame and may be reassigned.
+        key = (self.number, command_number)
+        data = self._encoded.get(key)
+        if data is None:
+            data = BinaryCommand(self.number, command_number).encode()
+            self._encoded[key] = data
+
+        with self.port.lock:
+            self.port.write_raw(data)
+            reply = self.port.read()
+
+        if reply.device_number != self.number:
+            raise UnexpectedReplyError(
+                "Received an unexpected reply from device number {0:d}".format(
+                    reply.device_number
+                ),
+                reply
+            )
+        return reply
@@ -6,6 +6,27 @@ import struct
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# The 6-byte frame: device number, command number, 32-bit data.
+_FRAME = struct.Struct("<2Bl")
+# A frame whose top data byte is a message ID: the low 16 bits of data,
+# the signed third byte of data, then the message ID.
+_FRAME_ID = struct.Struct("<2BHbB")
+
+
+def _unpack(reply, message_id):
+    """Returns the device number, command number, data and message ID
+    (or None) encoded in a 6-byte reply."""
+    if not message_id:
+        device_number, command_number, data = _FRAME.unpack(reply)
+        return device_number, command_number, data, None
+
+    # The message ID replaces the top byte of the data. Reading the third
+    # byte as signed sign extends the remaining 24 bits; if the data is
+    # more than 24 bits it will still be wrong, but now negative smaller
+    # values will be right.
+    device_number, command_number, low, high, mid = _FRAME_ID.unpack(reply)
+    return device_number, command_number, (high << 16) | low, mid
+
 
 class BinaryReply(object):
     """Models a single reply in Zaber's Binary protocol.
@@ -18,6 +39,9 @@ class BinaryReply(object):
         data: The data value associated with the reply.
         message_id: The message ID number, if present, otherwise None.
     """
+
+    __slots__ = ("device_number", "command_number", "data", "message_id")
+
     def __init__(self, reply, message_id=False):
         """
         Args:
@@ -39,20 +63,8 @@ class BinaryReply(object):
                 binary (ascii) string.
         """
         if isinstance(reply, bytes):
-            self.device_number, self.command_number, self.data = \
-                    struct.unpack("<2Bl", reply)
-            if (message_id):
-                # Use bitmasks to extract the message ID.
-                self.message_id = (self.data & 0xFF000000) >> 24
-                self.data = self.data & 0x00FFFFFF
-
-                # Sign extend 24 to 32 bits in the message ID case.
-                # If the data is more than 24 bits it will still be wrong,
-                # but now negative smaller values will be right.
-                if 0 != (self.data & 0x00800000):
-                    self.data = (int)((self.data | 0xFF000000) - (1 << 32))
-            else:
-                self.message_id = None
+            (self.device_number, self.command_number, self.data,
+             self.message_id) = _unpack(reply, message_id)
 
         elif isinstance(reply, list):
             # Assume a 4th element is a message ID.
@@ -68,6 +80,27 @@ class BinaryReply(object):
                             "('bytes' type) or a list.")
 
 
+    @classmethod
+    def from_bytes(cls, reply, message_id=False):
+        """Creates a BinaryReply from a 6-byte reply without the type
+        checks done by the constructor. Used on the receive path, where
+        the reply is always a byte string.
+
+        Args:
+            reply: A byte string of length 6 containing a binary reply
+                encoded according to Zaber's Binary Protocol Manual.
+            message_id: True if a message ID should be extracted from
+                the reply, False if not.
+
+        Returns:
+            A new BinaryReply.
+        """
+        self = cls.__new__(cls)
+        (self.device_number, self.command_number, self.data,
+         self.message_id) = _unpack(reply, message_id)
+        return self
+
+
     def encode(self):
         """Returns the reply as a binary string, in the form in which it
         would appear if it had been read from the serial port.
@@ -76,8 +109,7 @@ class BinaryReply(object):
             A byte string of length 6 formatted according to the Binary
             Protocol Manual.
         """
-        return struct.pack("<2Bl",
-                           self.device_number,
+        return _FRAME.pack(self.device_number,
                            self.command_number,
                            self.data)
 
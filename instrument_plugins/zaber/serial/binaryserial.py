@@ -1,7 +1,8 @@
 import logging
 import serial
-import sys
-from threading import RLock
+import struct
+import warnings
+from threading import Lock, RLock
 
 from .binarycommand import BinaryCommand
 from .binaryreply import BinaryReply
@@ -12,6 +13,33 @@ from .timeouterror import TimeoutError
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+_VALID_BAUDS = frozenset([115200, 57600, 38400, 19200, 9600])
+
+# Packs device number, command number and data into a 6-byte command.
+_PACK = struct.Struct("<2Bl").pack
+# Unpacks a 6-byte reply, in place, into device number, command number
+# and data.
+_UNPACK_FROM = struct.Struct("<2Bl").unpack_from
+# The most integer commands whose encoding write() keeps.
+_ENCODED_MAX = 128
+
+
+class _NoLock(object):
+    """Stands in for the port's lock when locking is turned off. Entering
+    and leaving it does nothing. (contextlib.nullcontext is Python 3.7+.)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
 
 class BinarySerial(object):
     """A class for interacting with Zaber devices using the Binary protocol.
@@ -29,13 +57,17 @@ class BinarySerial(object):
             specify an infinite timeout. A value of 0 specifies that all reads
             and writes should be non-blocking (return immediately without
             waiting). Defaults to 5.
-        lock: The threading.RLock guarding the port. Each method takes the lock
+        lock: The lock guarding the port. Each method takes the lock
             and is therefore thread safe. However, to ensure no other threads
             access the port across multiple method calls, the caller should
             acquire the lock and release it once all methods have returned.
+            This needs a threading.RLock, which is the default; a port made
+            with reentrant=False has a cheaper threading.Lock instead, and
+            one made with lock=False does no locking at all.
     """
 
-    def __init__(self, port, baud=9600, timeout=5, inter_char_timeout=0.5):
+    def __init__(self, port, baud=9600, timeout=5, inter_char_timeout=0.5,
+                 reentrant=True, lock=None):
         """Creates a new instance of the BinarySerial class.
 
         Args:
@@ -50,6 +82,19 @@ class BinarySerial(object):
                 to wait between bytes in a reply. If your computer is bad at
                 reading incoming serial data in a timely fashion, try
                 increasing this value.
+            reentrant: True to guard the port with a threading.RLock, so
+                that a thread holding *lock* can still call the methods of
+                this port. BinaryDevice does this, so it needs a port with
+                the default of True. Pass False for a plain threading.Lock
+                when the port is only used through its own methods.
+            lock: Optional. The lock to guard the port with instead of
+                a new one, for example one shared with other code. Pass
+                False to turn locking off when the port is only ever
+                used from one thread, as in most measurement scripts::
+
+                    >>> port = BinarySerial("COM3", lock=False)
+
+                The port is then no longer thread safe.
 
         Notes:
             This class will open the port immediately upon
@@ -73,7 +118,17 @@ class BinarySerial(object):
             self._ser = serial.Serial(port, baud, timeout=timeout,
                                       interCharTimeout=inter_char_timeout)
 
-        self._lock = RLock()
+        if lock is False:
+            self._lock = _NoLock()
+        elif lock is not None:
+            self._lock = lock
+        else:
+            self._lock = RLock() if reentrant else Lock()
+        # in_waiting replaced inWaiting() in pyserial 3.0.
+        self._has_in_waiting = hasattr(self._ser, "in_waiting")
+        self._has_readinto = hasattr(self._ser, "readinto")
+        # Encoded commands by integer arguments, for repeated writes.
+        self._encoded = {}
 
 
     def write(self, *args):
@@ -110,6 +165,29 @@ class BinarySerial(object):
                 to the specification of ``*args`` above.
             ValueError: A string of length other than 6 was passed.
         """
+        if 1 < len(args) < 4 and all(type(arg) is int for arg in args):
+            # Plain integers without a message ID, the usual case, are
+            # packed straight into a command without a BinaryCommand,
+            # and only the first time they are sent.
+            data = self._encoded.get(args)
+            if data is None:
+                try:
+                    data = _PACK(args[0], args[1],
+                                 args[2] if len(args) == 3 else 0)
+                except struct.error:
+                    # Out of range; BinaryCommand raises the right ValueError.
+                    BinaryCommand(*args)
+                    raise
+                if len(self._encoded) >= _ENCODED_MAX:
+                    self._encoded.clear()
+                self._encoded[args] = data
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("> [%d, %d, %d]", args[0], args[1],
+                             args[2] if len(args) == 3 else 0)
+            with self._lock:
+                self._ser.write(data)
+            return
+
         if len(args) == 1:
             message = args[0]
             if isinstance(message, list):
@@ -120,16 +198,23 @@ class BinarySerial(object):
             raise TypeError("write() takes at least 1 and no more than 4 "
                             "arguments ({0:d} given)".format(len(args)))
 
-        if isinstance(message, str):
+        if isinstance(message, bytes):
+            # Already encoded (every str on Python 2), so no copy is made.
+            logger.debug("> %r", message)
+            if len(message) != 6:
+                raise ValueError("write of a string expects length 6.")
+            data = message
+
+        elif isinstance(message, str):
+            warnings.warn("Passing a str to write() is deprecated; pass the "
+                          "6 bytes of the command instead.",
+                          DeprecationWarning, stacklevel=2)
             logger.debug("> %s", message)
             if len(message) != 6:
                 raise ValueError("write of a string expects length 6.")
 
             # pyserial doesn't handle hex strings.
-            if sys.version_info > (3, 0):
-                data = bytes(message, "UTF-8")
-            else:
-                data = bytes(message)
+            data = bytes(message, "UTF-8")
 
         elif isinstance(message, BinaryCommand):
             data = message.encode()
@@ -143,6 +228,18 @@ class BinarySerial(object):
             self._ser.write(data)
 
 
+    def write_raw(self, data):
+        """Writes already encoded commands to the port.
+
+        Args:
+            data: A byte string holding one or more 6-byte commands, as
+                returned by BinaryCommand.encode().
+        """
+        logger.debug("> %d bytes", len(data))
+        with self._lock:
+            self._ser.write(data)
+
+
     def read(self, message_id=False):
         """Reads six bytes from the port and returns a BinaryReply.
 
@@ -164,11 +261,111 @@ class BinarySerial(object):
         if len(reply) != 6:
             logger.debug("< Receive timeout!")
             raise TimeoutError("read timed out.")
-        parsed_reply = BinaryReply(reply, message_id)
+        parsed_reply = BinaryReply.from_bytes(reply, message_id)
         logger.debug("< %s", parsed_reply)
         return parsed_reply
 
 
+    def read_raw(self, count):
+        """Reads several 6-byte replies from the port in one call.
+
+        Args:
+            count: The number of replies to read.
+
+        Returns:
+            A byte string of length 6 * *count*.
+
+        Raises:
+            zaber.serial.TimeoutError: Fewer than *count* replies were
+                read before the specified timeout elapsed.
+        """
+        with self._lock:
+            data = self._ser.read(6 * count)
+
+        if len(data) != 6 * count:
+            logger.debug("< Receive timeout!")
+            raise TimeoutError("read timed out.")
+        return data
+
+
+    def read_tuple(self, buf=None):
+        """Reads six bytes from the port and returns them unpacked,
+        without creating a BinaryReply.
+
+        Args:
+            buf: Optional. A bytearray of length 6 to read the reply
+                into. Passing the same one on every call saves
+                allocating a new buffer per reply.
+
+        Returns:
+            A tuple of the device number, command number and data of
+            the reply. Replies with a message ID must be read with
+            read() instead.
+
+        Raises:
+            zaber.serial.TimeoutError: No data was read before the
+                specified timeout elapsed.
+        """
+        if buf is None:
+            buf = bytearray(6)
+        with self._lock:
+            if self._has_readinto:
+                count = self._ser.readinto(buf)
+            else:
+                data = self._ser.read(6)
+                count = len(data)
+                buf[:count] = data
+
+        if count != 6:
+            logger.debug("< Receive timeout!")
+            raise TimeoutError("read timed out.")
+        return _UNPACK_FROM(buf)
+
+
+    def read_many(self, max_replies, message_id=False):
+        """Reads every complete reply already received by the port, up
+        to *max_replies*, in a single read call.
+
+        If no complete reply has arrived yet, this waits for one, as
+        read() does.
+
+        Args:
+            max_replies: The largest number of replies to return.
+            message_id: True if the responses are expected to have a
+                message ID. Defaults to False.
+
+        Returns:
+            A list of between 1 and *max_replies* BinaryReplies, in the
+            order in which they were received.
+
+        Raises:
+            zaber.serial.TimeoutError: No reply, or only part of the
+                last reply, was read before the specified timeout
+                elapsed.
+        """
+        with self._lock:
+            if self._has_in_waiting:
+                waiting = self._ser.in_waiting
+            else:
+                waiting = self._ser.inWaiting()
+            count = max(1, min(waiting // 6, max_replies))
+            data = self._ser.read(6 * count)
+            if len(data) % 6:
+                # Finish the reply the read stopped in, so the next read
+                # starts on a reply boundary.
+                data += self._ser.read(6 - len(data) % 6)
+
+        if len(data) < 6 or len(data) % 6:
+            logger.debug("< Receive timeout!")
+            raise TimeoutError("read timed out.")
+        replies = [BinaryReply.from_bytes(data[i:i + 6], message_id)
+                   for i in range(0, len(data) - 5, 6)]
+        if logger.isEnabledFor(logging.DEBUG):
+            for reply in replies:
+                logger.debug("< %s", reply)
+        return replies
+
+
     def flush(self):
         """Flushes the buffers of the underlying serial port."""
         with self._lock:
@@ -184,7 +381,7 @@ class BinarySerial(object):
         Returns:
             True if a response is available to read; False otherwise.
         """
-        if (hasattr(self._ser, "in_waiting")):
+        if self._has_in_waiting:
             return (self._ser.in_waiting >= 6)
         else:
             return (self._ser.inWaiting() >= 6)
@@ -252,7 +449,7 @@ class BinarySerial(object):
 
     @baudrate.setter
     def baudrate(self, b):
-        if b not in (115200, 57600, 38400, 19200, 9600):
+        if b not in _VALID_BAUDS:
             raise ValueError("Invalid baud rate: {:d}. Valid baud rates are "
                              "115200, 57600, 38400, 19200, and 9600.".format(b))
         with self._lock:
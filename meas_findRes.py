@@ -5,11 +5,9 @@ Written by Philipp Uhrich
 '''
 
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import signal as sig
-import peakutils
-from peakutils.plot import plot as pplot
 import os
+import json
 import datetime
 import misc
 
@@ -20,6 +18,43 @@ import postprocessing_libs as ppl
 import meas_switch as switch
 
 
+def phase_unwrap(trace, start=None):
+    """Phase and unwrapped phase of a VNA trace. Same results as np.angle and np.unwrap, with the
+        unwrap done in place on a single array of sample-to-sample phase differences.
+        Options:
+            start: value for the first unwrapped sample, to continue the phase of a previous trace.
+                   Defaults to the first phase, as np.unwrap does.
+        Returns:
+            phases, phases_unwrap
+    """
+    phases = np.angle(trace)
+    # -- Unwrap: fold every jump of pi or more back into [-pi, pi)
+    d = np.diff(phases)
+    jumps = np.abs(d) >= np.pi
+    if jumps.any():
+        dj = d[jumps]
+        folded = np.mod(dj + np.pi, 2 * np.pi) - np.pi
+        folded[(folded == -np.pi) & (dj > 0)] = np.pi
+        d[jumps] = folded
+    phases_unwrap = np.empty(len(phases))
+    phases_unwrap[0] = phases[0] if start is None else start
+    np.cumsum(d, out=phases_unwrap[1:])
+    phases_unwrap[1:] += phases_unwrap[0]
+    return phases, phases_unwrap
+
+def abs_gradient(x, dx):
+    """Same as np.abs(np.gradient(x, dx)) for uniformly spaced samples: central differences inside,
+        one-sided differences at both ends, all built from one np.diff in a single output buffer.
+    """
+    d = np.diff(x)
+    grads = np.empty(len(x))
+    np.add(d[:-1], d[1:], out=grads[1:-1])
+    grads[1:-1] *= 0.5
+    grads[0] = d[0]
+    grads[-1] = d[-1]
+    grads *= 1.0 / dx
+    return np.abs(grads, out=grads)
+
 def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4, points=3, vna_power=-10, docomment=True, doplot = True, outrange=True):
     """Take VNA trace and identify possible microwave resonances
         Input:
@@ -52,6 +87,8 @@ def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4
     # Phase gradient data
     superdict['Phase unwrapped (rad)'] = []
     superdict['Phase gradient (rad/Hz)'] = []
+    # Traces of the subintervals, joined once all are taken
+    freqs_parts, trace_parts, phase_parts, phu_parts = [], [], [], []
     try:
 
         # --- VNA parameters ---
@@ -94,17 +131,19 @@ def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4
         freqs, trace = netw.trace(measure=1, get_result=1,make_plot=doplot, artist=2,filepath = data_path + raw_data_folder + 'vna_traces' + '/vna_trace_0' + '/vna_trace.dat')
         freqs *= 1e9
         # -- Gradient data
-        phases = np.angle(trace)
-        phases_unwrap = np.unwrap(phases)
-        phases_unwrap_total = np.array(phases_unwrap)
-        grads = np.abs(np.gradient(phases_unwrap, fdelta))
+        phases, phases_unwrap = phase_unwrap(trace)
+        phases_unwrap_total = phases_unwrap
+        freqs_parts.append(freqs)
+        trace_parts.append(trace)
+        phase_parts.append(phases)
+        phu_parts.append(phases_unwrap)
 
         if subints > 1: # multiple traces over subintervals
 
             for i in np.arange(1, int(subints)):
 
                 # parameters required to correct for phase change between successive VNA traces
-                phu_last = phases_unwrap_total[-1]
+                phu_last = phu_parts[-1][-1]
 
                 fstart = fmin + i * span
                 fstop = fstart + span
@@ -115,34 +154,47 @@ def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4
                 fs, t = netw.trace(measure=1, get_result=1,make_plot=doplot, artist=2, filepath = data_path + raw_data_folder + 'vna_traces' + '/vna_trace_' + str(i) + '/vna_trace.dat')
                 fs *= 1e9
 
-                phases = np.angle(t)
-                phases_unwrap = np.unwrap(phases)
-                phases_unwrap_shifted = np.array(phases_unwrap) + (phu_last - phases_unwrap[0])
-                phases_unwrap_total = np.append(phases_unwrap_total, phases_unwrap_shifted)
+                phases, phases_unwrap = phase_unwrap(t, start=phu_last) # unwrapped straight onto the previous trace
 
-                freqs = np.append(freqs, fs)
-                trace = np.append(trace, t)
-
-                grads = np.append(grads, np.abs(np.gradient(phases_unwrap, fdelta)))
+                freqs_parts.append(fs)
+                trace_parts.append(t)
+                phase_parts.append(phases)
+                phu_parts.append(phases_unwrap)
     except Exception as E:
         raise E
     finally:
         # -- Put VNA back to where it was
         if outrange: netw.setbackrange(settings)
 
+        # -- Join the subinterval traces in one go rather than appending each time
+        if len(freqs_parts) > 1:
+            freqs = np.concatenate(freqs_parts)
+            trace = np.concatenate(trace_parts)
+            phases = np.concatenate(phase_parts)
+            phases_unwrap_total = np.concatenate(phu_parts)
+
+        # -- Gradient over the joined, shifted phase, so the subinterval boundaries get proper derivatives
+        if phu_parts:
+            grads = abs_gradient(phases_unwrap_total, fdelta)
+
         # --- Update dictionary ---
-        superdict['Frequency (Hz)'] = np.array(freqs)
-        superdict['Phase (rad)'] = np.array(phases)
-        superdict['Trace'] = np.array(trace)
-        superdict['Phase unwrapped (rad)'] = np.array(phases_unwrap)
-        superdict['Phase gradient (rad/Hz)'] = np.array(grads)
-        # --- Save dictionary ---
-        np.save(data_path + '/superdict.npy', np.array(superdict))
+        superdict['Frequency (Hz)'] = np.asarray(freqs)
+        superdict['Phase (rad)'] = np.asarray(phases)
+        superdict['Trace'] = np.asarray(trace)
+        superdict['Phase unwrapped (rad)'] = np.asarray(phases_unwrap_total)
+        superdict['Phase gradient (rad/Hz)'] = np.asarray(grads)
+        # --- Save dictionary: arrays unpickled in an npz archive, the port in a small json file ---
+        np.savez(data_path + '/superdict.npz', freqs=superdict['Frequency (Hz)'], phase=superdict['Phase (rad)'],
+                 trace=superdict['Trace'], phase_unwrap=superdict['Phase unwrapped (rad)'],
+                 grads=superdict['Phase gradient (rad/Hz)'])
+        with open(data_path + '/superdict.json', 'w') as f:
+            json.dump({'Port': port}, f)
 
         # -- Plot amplitude and phase trace
-        amps = np.array(10 * np.log10(np.abs(trace) ** 2))
+        amps = 10 * np.log10(trace.real ** 2 + trace.imag ** 2) # |S12|^2 without the sqrt in np.abs
 
         if doplot:
+            import matplotlib.pyplot as plt # only imported when plotting, headless runs skip it
             figname = 'VNA trace [fmin, fmax]='+str([fmin,fmax])
             fig = plt.figure(figname, figsize=(20,15))
             ax1 = fig.add_subplot(3, 1, 1)
@@ -153,7 +205,7 @@ def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4
             ax1.grid(linestyle='--')
 
             ax2 = fig.add_subplot(3, 1, 3)
-            ax2.plot(freqs, np.angle(trace))
+            ax2.plot(freqs, phases)
             ax2.set_ylabel(r'Phase mod$(2\pi)$ (rad)')
             ax1.set_xlabel('Frequency (Hz)')
 
@@ -168,6 +220,22 @@ def phasegrad_VNA(portpath='', fmin=2.6e9, fmax=8e9, resolution=1e4, max_nop=1e4
         # -- Return data
         return superdict
 
+def slice_heights(signal, nop_slices, stdv=1):
+    """Adaptive peak height for every sample: mean + stdv * std of the slice of nop_slices
+        consecutive samples it falls in. The last slice holds the remainder and may be shorter.
+        Signals stacked along the first axis are sliced along the last axis in a single pass.
+    """
+    signal = np.asarray(signal)
+    nop = signal.shape[-1]
+    n = (nop // nop_slices) * nop_slices
+    full = signal[..., :n].reshape(signal.shape[:-1] + (-1, nop_slices))
+    heights = np.repeat(full.mean(axis=-1) + stdv * full.std(axis=-1), nop_slices, axis=-1)
+    if n < nop:
+        tail = signal[..., n:]
+        tail_heights = tail.mean(axis=-1) + stdv * tail.std(axis=-1)
+        heights = np.concatenate([heights, np.repeat(tail_heights[..., np.newaxis], nop - n, axis=-1)], axis=-1)
+    return heights
+
 def find_peaks(portpath='', freqs=[], grads=[], load=False, orig_sig=True, dist_peaks= 10e6,
                svw = 101, svp = 3, winlen = 1e6, freq_slice=10e6, stdv = 1, doplot=True):
     """
@@ -221,9 +289,18 @@ def find_peaks(portpath='', freqs=[], grads=[], load=False, orig_sig=True, dist_
         # -- Load data
         if load:
             print('Loading superdict')
-            loaddict = np.load(portpath + '/superdict.npy').item()#, encoding='latin1').item()#
-            freqs = np.array(loaddict['Frequency (Hz)'])
-            grads = np.array(loaddict['Phase gradient (rad/Hz)'])
+            if os.path.exists(portpath + '/superdict.npz'):
+                # Only the two arrays needed are read from the archive
+                loaddict = np.load(portpath + '/superdict.npz')
+                freqs = loaddict['freqs']
+                grads = loaddict['grads']
+                loaddict.close()
+            else: # pickled superdict.npy saved by earlier versions
+                loaddict = np.load(portpath + '/superdict.npy', allow_pickle=True).item()#, encoding='latin1').item()#
+                freqs = np.array(loaddict['Frequency (Hz)'])
+                grads = np.array(loaddict['Phase gradient (rad/Hz)'])
+        freqs = np.asarray(freqs)
+        grads = np.asarray(grads)
 
         peakdict['Frequency (Hz)'] = freqs
         peakdict['Phase gradient (rad/Hz)'] = grads
@@ -231,56 +308,46 @@ def find_peaks(portpath='', freqs=[], grads=[], load=False, orig_sig=True, dist_
         # -- Filtering: Sav-Gol
         fdelta = (freqs[-1] - freqs[0])/(len(freqs)-1) # freqeuncy spacing of points
         grads_filt = sig.savgol_filter(grads, svw, svp)
-        grads_filt = grads_filt/max(grads_filt) # Normalise to max gradient
+        grads_filt /= grads_filt.max() # Normalise to max gradient, in place
         peakdict['Phase gradient filt'] = grads_filt
 
         # -- Peak detection
         # Slice up the data for adaptive height and prominence calculation
         slices = np.ceil((freqs[-1] - freqs[0])/freq_slice) # number of slices
         nop_slices = int(np.floor(len(grads_filt)/slices)) # number of samples in slice
-        height_slices = [np.ones_like(freqs[i:i+nop_slices]) for i in range(0, len(freqs), nop_slices)]
-        grads_slices = [grads[i:i+nop_slices] for i in range(0, len(grads), nop_slices)]
-        grads_slices_filt = [grads_filt[i:i+nop_slices] for i in range(0, len(grads_filt), nop_slices)]
 
         # Calculate number of samples in frequency intervals
         dist_points = round(dist_peaks / fdelta)
         winlength = round(winlen/fdelta)
 
-        # -- Unfiltered signal
+        # Adaptive value used for height and prominence, for both signals at once where both are needed
         if orig_sig:
-            for i, slicy in enumerate(grads_slices):# adaptive value used for height and prominence
-                height = (np.mean(slicy) + stdv * np.std(slicy))
-                height_slices[i] = height_slices[i] * height
+            heights_orig, heights_filt = slice_heights(np.vstack([grads, grads_filt]), nop_slices, stdv)
+        else:
+            heights_filt = slice_heights(grads_filt, nop_slices, stdv)
 
-            heights_orig = np.array([item for slice in height_slices for item in slice])
-            peaks_orig, _ = sig.find_peaks(grads, wlen=winlength, height=heights_orig,
+        # -- Unfiltered signal
+        if orig_sig:
+            peaks_orig, props = sig.find_peaks(grads, wlen=winlength, height=heights_orig,
                                            distance=dist_points, prominence=heights_orig)
-            proms = sig.peak_prominences(grads, peaks_orig)
+            proms = props['prominences'] # already computed by find_peaks, with the same wlen
             contour_heights_grads = grads[peaks_orig] - proms
 
-            peakdict['Peak indexes orig'] = np.array(peaks_orig)
+            peakdict['Peak indexes orig'] = np.asarray(peaks_orig)
             peakdict['Heights orig'] = heights_orig
-            peakdict['Peak freqs orig'] = [freqs[index] for index in peaks_orig]
-            peakdict['Peak grads orig'] = [grads[index] for index in peaks_orig]
+            peakdict['Peak freqs orig'] = freqs[peaks_orig]
+            peakdict['Peak grads orig'] = grads[peaks_orig]
 
         # -- Filtered signal
-        # reset height slices
-        height_slices = [np.ones_like(freqs[i:i+nop_slices]) for i in range(0, len(freqs), nop_slices)]
-
-        for i, slicy in enumerate(grads_slices_filt):
-            height = (np.mean(slicy) + stdv * np.std(slicy))
-            height_slices[i] = height_slices[i] * height
-
-        heights_filt = np.array([item for slice in height_slices for item in slice])
-        peaks_filt, _ = sig.find_peaks(grads_filt, wlen=winlength, height=heights_filt,
+        peaks_filt, props_filt = sig.find_peaks(grads_filt, wlen=winlength, height=heights_filt,
                                        distance=dist_points, prominence=heights_filt)
-        proms_filt = sig.peak_prominences(grads_filt, peaks_filt)
+        proms_filt = props_filt['prominences']
         contour_heights_grads_filt = grads_filt[peaks_filt] - proms_filt
 
-        peakdict['Peak indexes filt'] = np.array(peaks_filt)
+        peakdict['Peak indexes filt'] = np.asarray(peaks_filt)
         peakdict['Heights filt'] = heights_filt
-        peakdict['Peak freqs filt'] = [freqs[index] for index in peaks_filt]
-        peakdict['Peak grads filt'] = [grads_filt[index] for index in peaks_filt]
+        peakdict['Peak freqs filt'] = freqs[peaks_filt]
+        peakdict['Peak grads filt'] = grads_filt[peaks_filt]
         # CHANGE THE ABOVE TO RETURN ORIGINAL GRADIENT
 
         # -- Plot
@@ -290,6 +357,7 @@ def find_peaks(portpath='', freqs=[], grads=[], load=False, orig_sig=True, dist_
             c = 2  # Add subfigure
 
         if doplot:
+            import matplotlib.pyplot as plt
             figname = 'peaks_at_port_' + port
             fig = plt.figure(figname, figsize=(20, 5))
 
@@ -320,6 +388,6 @@ def find_peaks(portpath='', freqs=[], grads=[], load=False, orig_sig=True, dist_
 
     finally:
         # Save peakdict
-        np.save(portpath + '/peakdict.npy', np.array(peakdict))
+        np.save(portpath + '/peakdict.npy', peakdict, allow_pickle=True)
 
         return peakdict